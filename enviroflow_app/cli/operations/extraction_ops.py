@@ -25,8 +25,9 @@ Data Scale:
 """
 
 import asyncio
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import polars as pl
 import streamlit as st
@@ -48,6 +49,173 @@ DATA_DIR = Path("Data")
 # Ensure directories exist
 PROCESSED_PARQUET_DIR.mkdir(parents=True, exist_ok=True)
 
+# Column typing for the P&L costs and sales tables
+XERO_COSTS_FINANCIAL_COLUMNS = [
+    "Debit",
+    "Credit",
+    "Running Balance",
+    "Gross",
+    "net",
+    "GST",
+    "amount",
+]
+XERO_COSTS_TEXT_COLUMNS = ["Account", "Description", "Supplier", "Reference"]
+XERO_SALES_FINANCIAL_COLUMNS = [
+    "Debit",
+    "Credit",
+    "Running Balance",
+    "Gross",
+    "GST",
+    "amount",
+]
+
+# Days between the Excel epoch (1899-12-30) and the Unix epoch (1970-01-01)
+EXCEL_EPOCH_OFFSET_DAYS = 25569
+
+# Largest date serial Excel supports (9999-12-31)
+EXCEL_MAX_SERIAL = 2958465
+
+
+def _serial_to_date(serial: pl.Expr) -> pl.Expr:
+    """
+    Convert integer Excel serials to pl.Date, nulling values outside Excel's range.
+    """
+    in_range = pl.when(serial.is_between(0, EXCEL_MAX_SERIAL)).then(serial)
+    return pl.from_epoch(in_range - EXCEL_EPOCH_OFFSET_DAYS, time_unit="d")
+
+
+def _excel_serial_date_expr(dtype: pl.DataType) -> pl.Expr:
+    """
+    Build an expression converting the Excel serial 'Date' column to pl.Date.
+
+    Numeric serials take a fast path of integer arithmetic and pl.from_epoch.
+    String columns are read as serial numbers where possible; only the rows
+    that are not serials are parsed as ISO dates (as stored in the fallback
+    file), with anything unparseable becoming null. Columns that are already
+    pl.Date are passed through unchanged.
+
+    Args:
+        dtype: Current dtype of the 'Date' column
+
+    Returns:
+        Polars expression producing the converted 'Date' column
+    """
+    serial = pl.col("Date")
+    if dtype == pl.Date:
+        return serial
+    if dtype.is_numeric():
+        return _serial_to_date(serial.cast(pl.Int64, strict=False)).alias("Date")
+    if dtype == pl.String:
+        text_serial = serial.cast(pl.Float64, strict=False).cast(pl.Int64, strict=False)
+        # Only rows that did not read as a serial are handed to strptime
+        not_serial = text_serial.is_null()
+        text_date = (
+            pl.when(not_serial)
+            .then(serial)
+            .str.strptime(pl.Date, "%Y-%m-%d", strict=False)
+        )
+        return (
+            pl.when(not_serial)
+            .then(text_date)
+            .otherwise(_serial_to_date(text_serial))
+            .alias("Date")
+        )
+    return serial.cast(pl.Date, strict=False)
+
+
+def _filter_valid_dates(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Convert the Excel serial 'Date' column and drop rows without a valid date.
+
+    Only the Date column is converted here; callers cast the remaining columns
+    afterwards so no work is spent on rows that are about to be dropped. If the
+    conversion fails the column is kept as-is and only null values are removed.
+
+    Args:
+        df: DataFrame straight from the P&L sheet (or fallback file)
+
+    Returns:
+        DataFrame with a converted 'Date' column and null-date rows removed
+    """
+    if "Date" not in df.columns:
+        return df
+
+    # Excel date serial numbers start from 1900-01-01 (day 1)
+    # Excel incorrectly treats 1900 as a leap year, so we use 1899-12-30 as day 0
+    dates = df["Date"]
+    try:
+        dates = df.select(_excel_serial_date_expr(dates.dtype)).to_series()
+    except Exception as date_error:
+        console.print(f"⚠️ [yellow]Date conversion warning: {date_error}[/yellow]")
+        console.print("⚠️ [yellow]Keeping Date column as string for now[/yellow]")
+
+    mask = dates.is_not_null()
+    filtered = df.filter(mask).with_columns(dates.filter(mask))
+
+    removed_count = len(df) - len(filtered)
+    if removed_count > 0:
+        console.print(f"🧹 Removed {removed_count} rows with null dates")
+        console.print(f"📊 Remaining records: {len(filtered)}")
+
+    return filtered
+
+
+def _cast_columns(
+    df: pl.DataFrame,
+    financial_columns: List[str],
+    text_columns: Optional[List[str]] = None,
+) -> pl.DataFrame:
+    """
+    Cast financial columns to Float64 and text columns to String in one pass.
+
+    All casts are built as expressions and applied with a single
+    `with_columns`, so Polars evaluates them together instead of
+    materialising a new frame per column. Columns missing from the frame are
+    skipped and columns not listed are left untouched.
+
+    Args:
+        df: DataFrame to type
+        financial_columns: Columns to cast to Float64; String values have
+                           thousands separators stripped first
+        text_columns: Optional columns to cast to String
+
+    Returns:
+        DataFrame with the listed columns cast
+    """
+    schema = df.schema
+    exprs = []
+    for col in financial_columns:
+        if col not in schema:
+            continue
+        amount = pl.col(col)
+        if schema[col] == pl.String:
+            amount = amount.str.replace_all(",", "")
+        exprs.append(amount.cast(pl.Float64, strict=False))
+    exprs.extend(
+        pl.col(col).cast(pl.String) for col in text_columns or [] if col in schema
+    )
+
+    return df.with_columns(exprs) if exprs else df
+
+
+@lru_cache(maxsize=8)
+def _read_costs_parquet(path: str, mtime_ns: int) -> pl.DataFrame:
+    """
+    Read a fallback costs parquet file, caching the result per file version.
+
+    The modification time is part of the cache key, so rewriting the file
+    invalidates the cached frame. Callers should `.clone()` the result
+    before transforming it.
+
+    Args:
+        path: Path to the parquet file
+        mtime_ns: File modification time in nanoseconds (cache key only)
+
+    Returns:
+        Polars DataFrame read from the file
+    """
+    return pl.read_parquet(path)
+
 
 def _save_dataframe(
     df: pl.DataFrame,
@@ -280,7 +448,7 @@ def extract_float_data(config: Optional[Any] = None) -> Dict[str, Any]:
         raise
 
 
-def extract_xero_costs(config: Optional[Any] = None) -> Dict[str, Any]:
+async def extract_xero_costs_async(config: Optional[Any] = None) -> Dict[str, Any]:
     """
     Extract Xero costs data from Google Sheets P&L spreadsheet with enhanced processing.
 
@@ -318,108 +486,54 @@ def extract_xero_costs(config: Optional[Any] = None) -> Dict[str, Any]:
     try:
         # Import the P&L Google Sheets client
         from enviroflow_app.gsheets import create_pnl_client
-        import asyncio
-
-        async def _extract_costs():
-            # Initialize the P&L client
-            console.print("🔑 Initializing P&L Google Sheets client...")
-            client = create_pnl_client()
 
-            # Find the Project P&L Report spreadsheet
-            console.print("🔍 Searching for Project P&L Report spreadsheet...")
-            spreadsheets = await client.list_spreadsheets()
-            pnl_spreadsheet = None
+        # Initialize the P&L client
+        console.print("🔑 Initializing P&L Google Sheets client...")
+        client = create_pnl_client()
 
-            for spreadsheet in spreadsheets:
-                if "Project P&L Report" in spreadsheet.title:
-                    pnl_spreadsheet = spreadsheet
-                    break
+        # Find the Project P&L Report spreadsheet
+        console.print("🔍 Searching for Project P&L Report spreadsheet...")
+        spreadsheets = await client.list_spreadsheets()
+        pnl_spreadsheet = None
 
-            if not pnl_spreadsheet:
-                console.print(
-                    "❌ [bold red]Project P&L Report spreadsheet not found[/bold red]"
-                )
-                raise ValueError("Project P&L Report spreadsheet not found")
-
-            console.print(f"✅ Found spreadsheet: {pnl_spreadsheet.title}")
-
-            # Extract the costs table using the specialized P&L parser
-            console.print("📊 Extracting costs table...")
-            costs_df = await client.extract_pnl_table(
-                pnl_spreadsheet.spreadsheet_id, "costs", engine="polars"
-            )
+        for spreadsheet in spreadsheets:
+            if "Project P&L Report" in spreadsheet.title:
+                pnl_spreadsheet = spreadsheet
+                break
 
+        if not pnl_spreadsheet:
             console.print(
-                f"✅ Extracted {len(costs_df)} cost records from Google Sheets"
+                "❌ [bold red]Project P&L Report spreadsheet not found[/bold red]"
             )
+            raise ValueError("Project P&L Report spreadsheet not found")
 
-            # Check if we got the expected number of records
-            if len(costs_df) < 10000:
-                console.print(
-                    f"⚠️  [bold yellow]Warning: Only {len(costs_df)} records extracted, expected 13k+[/bold yellow]"
-                )
-                console.print(
-                    "This might indicate pagination or filtering issues in the source data."
-                )
-
-            return costs_df
+        console.print(f"✅ Found spreadsheet: {pnl_spreadsheet.title}")
 
-        # Run the async extraction
-        costs_df = asyncio.run(_extract_costs())
-
-        # Convert numeric columns from string to float
-        numeric_columns = ["Debit", "Credit", "Gross", "net", "GST"]
-        for col in numeric_columns:
-            if col in costs_df.columns:
-                costs_df = costs_df.with_columns(
-                    pl.col(col).str.replace_all(",", "").cast(pl.Float64, strict=False)
-                )
-
-        # Convert Date column from Excel serial number to proper date
-        if "Date" in costs_df.columns:
-            # Excel date serial numbers start from 1900-01-01 (day 1)
-            # Excel incorrectly treats 1900 as a leap year, so we use 1899-12-30 as day 0
-            # We can use simple date arithmetic in Polars
-            try:
-                # First, try to convert string numbers to integers
-                costs_df = costs_df.with_columns(
-                    pl.col("Date").cast(pl.Int32, strict=False).alias("date_int")
-                )
-
-                # Create the base date (Excel epoch)
-                # Use a fixed date and add the serial days
-                costs_df = costs_df.with_columns(
-                    pl.date(1899, 12, 30).alias("excel_epoch")
-                )
-
-                # Add the days to the epoch and ensure it's a Date type (not datetime/timestamp)
-                costs_df = costs_df.with_columns(
-                    (pl.col("excel_epoch") + pl.duration(days=pl.col("date_int")))
-                    .dt.date()
-                    .alias("Date")  # Explicitly cast to Date type
-                )
+        # Extract the costs table using the specialized P&L parser
+        console.print("📊 Extracting costs table...")
+        costs_df = await client.extract_pnl_table(
+            pnl_spreadsheet.spreadsheet_id, "costs", engine="polars"
+        )
 
-                # Clean up temporary columns
-                costs_df = costs_df.drop(["date_int", "excel_epoch"])
+        console.print(f"✅ Extracted {len(costs_df)} cost records from Google Sheets")
 
-            except Exception as date_error:
-                console.print(
-                    f"⚠️ [yellow]Date conversion warning: {date_error}[/yellow]"
-                )
-                console.print(
-                    "⚠️ [yellow]Keeping Date column as string for now[/yellow]"
-                )
+        # Check if we got the expected number of records
+        if len(costs_df) < 10000:
+            console.print(
+                f"⚠️  [bold yellow]Warning: Only {len(costs_df)} records extracted, expected 13k+[/bold yellow]"
+            )
+            console.print(
+                "This might indicate pagination or filtering issues in the source data."
+            )
 
-        # Filter out rows with null dates before saving
-        if "Date" in costs_df.columns:
-            initial_count = len(costs_df)
-            costs_df = costs_df.filter(pl.col("Date").is_not_null())
-            filtered_count = len(costs_df)
-            removed_count = initial_count - filtered_count
+        # Convert dates first and drop rows without one, so the column
+        # casts below only touch rows that are kept
+        costs_df = _filter_valid_dates(costs_df)
 
-            if removed_count > 0:
-                console.print(f"🧹 Removed {removed_count} rows with null dates")
-                console.print(f"📊 Remaining records: {filtered_count}")
+        # Type financial columns as Float64 and text columns as String
+        costs_df = _cast_columns(
+            costs_df, XERO_COSTS_FINANCIAL_COLUMNS, XERO_COSTS_TEXT_COLUMNS
+        )
 
         # Rename gen_proj to Project for consistency with analytics pipeline
         if "gen_proj" in costs_df.columns:
@@ -436,8 +550,9 @@ def extract_xero_costs(config: Optional[Any] = None) -> Dict[str, Any]:
                 [pl.col(c).cast(pl.String) for c in object_cols]
             )
 
-        # Save processed data
-        _save_dataframe(costs_df, "xero_costs", config)
+        # Save processed data off the event loop so the blocking DuckDB and
+        # parquet writes don't stall other coroutines
+        await asyncio.to_thread(_save_dataframe, costs_df, "xero_costs", config)
 
         console.print(
             "✅ [bold green]Xero costs data extracted successfully from Google Sheets![/bold green]"
@@ -469,64 +584,21 @@ def extract_xero_costs(config: Optional[Any] = None) -> Dict[str, Any]:
                 costs_df = pl.DataFrame([])
             else:
                 console.print(f"📖 Loading costs from reference file: {costs_file}")
-                costs_df = pl.read_parquet(costs_file)
+                costs_df = _read_costs_parquet(
+                    str(costs_file), costs_file.stat().st_mtime_ns
+                ).clone()
                 console.print(
                     f"✅ Loaded {len(costs_df)} cost records from fallback file"
                 )
 
-            # Convert numeric columns from string to float
-            numeric_columns = ["Debit", "Credit", "Gross", "net", "GST"]
-            for col in numeric_columns:
-                if col in costs_df.columns:
-                    costs_df = costs_df.with_columns(
-                        pl.col(col).str.replace(",", "").cast(pl.Float64, strict=False)
-                    )
-
-            # Convert Date column from Excel serial number to proper date
-            if "Date" in costs_df.columns:
-                # Excel date serial numbers start from 1900-01-01 (day 1)
-                # Excel incorrectly treats 1900 as a leap year, so we use 1899-12-30 as day 0
-                # We can use simple date arithmetic in Polars
-                try:
-                    # First, try to convert string numbers to integers
-                    costs_df = costs_df.with_columns(
-                        pl.col("Date").cast(pl.Int32, strict=False).alias("date_int")
-                    )
-
-                    # Create the base date (Excel epoch)
-                    # Use a fixed date and add the serial days
-                    costs_df = costs_df.with_columns(
-                        pl.date(1899, 12, 30).alias("excel_epoch")
-                    )
-
-                    # Add the days to the epoch and ensure it's a Date type (not datetime/timestamp)
-                    costs_df = costs_df.with_columns(
-                        (pl.col("excel_epoch") + pl.duration(days=pl.col("date_int")))
-                        .dt.date()
-                        .alias("Date")  # Explicitly cast to Date type
-                    )
-
-                    # Clean up temporary columns
-                    costs_df = costs_df.drop(["date_int", "excel_epoch"])
-
-                except Exception as date_error:
-                    console.print(
-                        f"⚠️ [yellow]Date conversion warning: {date_error}[/yellow]"
-                    )
-                    console.print(
-                        "⚠️ [yellow]Keeping Date column as string for now[/yellow]"
-                    )
-
-            # Filter out rows with null dates before saving
-            if "Date" in costs_df.columns:
-                initial_count = len(costs_df)
-                costs_df = costs_df.filter(pl.col("Date").is_not_null())
-                filtered_count = len(costs_df)
-                removed_count = initial_count - filtered_count
+            # Convert dates first and drop rows without one, so the column
+            # casts below only touch rows that are kept
+            costs_df = _filter_valid_dates(costs_df)
 
-                if removed_count > 0:
-                    console.print(f"🧹 Removed {removed_count} rows with null dates")
-                    console.print(f"📊 Remaining records: {filtered_count}")
+            # Type financial columns as Float64 and text columns as String
+            costs_df = _cast_columns(
+                costs_df, XERO_COSTS_FINANCIAL_COLUMNS, XERO_COSTS_TEXT_COLUMNS
+            )
 
             # Rename gen_proj to Project for consistency with analytics pipeline
             if "gen_proj" in costs_df.columns:
@@ -547,7 +619,7 @@ def extract_xero_costs(config: Optional[Any] = None) -> Dict[str, Any]:
                 )
 
             # Save processed data
-            _save_dataframe(costs_df, "xero_costs", config)
+            await asyncio.to_thread(_save_dataframe, costs_df, "xero_costs", config)
 
             console.print(
                 "✅ [bold green]Xero costs data loaded from fallback file![/bold green]"
@@ -562,6 +634,25 @@ def extract_xero_costs(config: Optional[Any] = None) -> Dict[str, Any]:
             raise
 
 
+def extract_xero_costs(config: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Synchronous entry point for `extract_xero_costs_async`.
+
+    Used by the CLI and DAG pipeline, which run tasks outside an event loop.
+    Code already running inside an event loop should await
+    `extract_xero_costs_async` directly (e.g. to gather it with other
+    extractions).
+
+    Args:
+        config: Pipeline configuration with output settings
+               If None, defaults to MotherDuck-only saving
+
+    Returns:
+        Dictionary containing the processed 'xero_costs' DataFrame
+    """
+    return asyncio.run(extract_xero_costs_async(config))
+
+
 def extract_sales_data(config: Optional[Any] = None) -> Dict[str, Any]:
     """
     Extract sales data from P&L Google Sheets with comprehensive column typing.
@@ -630,66 +721,12 @@ def extract_sales_data(config: Optional[Any] = None) -> Dict[str, Any]:
 
         sales_df = asyncio.run(_extract_sales())
 
-        # Convert numeric columns from string to float
-        numeric_columns = [
-            "Debit",
-            "Credit",
-            "Running Balance",
-            "Gross",
-            "GST",
-            "amount",
-        ]
-        for col in numeric_columns:
-            if col in sales_df.columns:
-                sales_df = sales_df.with_columns(
-                    pl.col(col).str.replace_all(",", "").cast(pl.Float64, strict=False)
-                )
-
-        # Convert Date column from Excel serial number to proper date
-        if "Date" in sales_df.columns:
-            # Excel date serial numbers start from 1900-01-01 (day 1)
-            # Excel incorrectly treats 1900 as a leap year, so we use 1899-12-30 as day 0
-            # We can use simple date arithmetic in Polars
-            try:
-                # First, try to convert string numbers to integers
-                sales_df = sales_df.with_columns(
-                    pl.col("Date").cast(pl.Int32, strict=False).alias("date_int")
-                )
-
-                # Create the base date (Excel epoch)
-                # Use a fixed date and add the serial days
-                sales_df = sales_df.with_columns(
-                    pl.date(1899, 12, 30).alias("excel_epoch")
-                )
-
-                # Add the days to the epoch and ensure it's a Date type (not datetime/timestamp)
-                sales_df = sales_df.with_columns(
-                    (pl.col("excel_epoch") + pl.duration(days=pl.col("date_int")))
-                    .dt.date()
-                    .alias("Date")  # Explicitly cast to Date type
-                )
+        # Convert dates first and drop rows without one, so the column
+        # casts below only touch rows that are kept
+        sales_df = _filter_valid_dates(sales_df)
 
-                # Clean up temporary columns
-                sales_df = sales_df.drop(["date_int", "excel_epoch"])
-
-            except Exception as date_error:
-                console.print(
-                    f"⚠️ [yellow]Date conversion warning: {date_error}[/yellow]"
-                )
-                console.print(
-                    "⚠️ [yellow]Keeping Date column as string for now[/yellow]"
-                )
-
-        # Filter out rows with null dates before saving
-        if "Date" in sales_df.columns:
-            initial_count = len(sales_df)
-            sales_df = sales_df.filter(pl.col("Date").is_not_null())
-            filtered_count = len(sales_df)
-            removed_count = initial_count - filtered_count
-
-            if removed_count > 0:
-                console.print(f"🧹 Removed {removed_count} rows with null dates")
-                console.print(f"📊 Remaining records: {filtered_count}")
+        # Convert numeric columns from string to float
+        sales_df = _cast_columns(sales_df, XERO_SALES_FINANCIAL_COLUMNS)
 
         # Handle Object columns for compatibility
         object_cols = [
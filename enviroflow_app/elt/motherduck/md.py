@@ -6,6 +6,7 @@ from functools import cached_property
 import duckdb
 import pandas as pd
 import polars as pl
+import pyarrow as pa
 from loguru import logger
 
 from enviroflow_app.helpers.str_helpers import check_sql_entity_names
@@ -78,32 +79,41 @@ class MotherDuck:
         """
         return list(itertools.chain(*self.conn.execute("SHOW TABLES").fetchall()))
 
-    def save_table(self, table_name: str, table: pl.DataFrame):
-        """Saves a Polars DataFrame to the database, creating or replacing the table.
+    def save_table(
+        self, table_name: str, table: pl.DataFrame | pd.DataFrame | pa.Table
+    ):
+        """Saves a DataFrame to the database, creating or replacing the table.
+
+        Arrow tables are scanned by DuckDB directly, skipping the pandas
+        conversion. Polars frames still go through pandas so their column types
+        in MotherDuck stay the same (e.g. Date as TIMESTAMP_MS). Each save runs
+        on its own cursor, so independent tables can be saved from separate
+        threads.
 
         Args:
             table_name (str): The name of the table to save.
-            table (pl.DataFrame): The Polars DataFrame to save.
+            table (pl.DataFrame | pd.DataFrame | pa.Table): The table to save.
 
         """
         name = check_sql_entity_names(table_name)
-        # check if table is pandas dataframe
-        if isinstance(table, pd.DataFrame):
+        # pandas and Arrow are scanned as-is; Polars goes through pandas
+        if isinstance(table, (pd.DataFrame, pa.Table)):
             table_to_save = table
         else:
             table_to_save = table.to_pandas()
-        try:
-            self.conn.execute(
-                f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM table_to_save",
-            )
-        except duckdb.Error as e:
-            logger.error(f"duckdb error:\n {e}\n")
-            logger.info(
-                f"saving table {table_name} with {table_to_save.columns} columns and shape:{table_to_save.shape} {self.db_name} on mother duck ",
-            )
-            self.conn.execute(
-                f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM table_to_save",
-            )
+        with self.conn.cursor() as cursor:
+            try:
+                cursor.execute(
+                    f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM table_to_save",
+                )
+            except duckdb.Error as e:
+                logger.error(f"duckdb error:\n {e}\n")
+                logger.info(
+                    f"saving table {table_name} with {table_to_save.shape[1]} columns and shape:{table_to_save.shape} {self.db_name} on mother duck ",
+                )
+                cursor.execute(
+                    f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM table_to_save",
+                )
 
         logger.info(f"saved table {table_name} to {self.db_name} on mother duck ")
 
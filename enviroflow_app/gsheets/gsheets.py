@@ -305,6 +305,56 @@ class GoogleSheetsClient:
             logger.error(f"Error getting sheet data: {error}")
             raise GoogleSheetsError(f"Failed to get sheet data: {error}")
 
+    async def batch_get(
+        self,
+        spreadsheet_id: str,
+        ranges: List[str],
+        value_render_option: str = "UNFORMATTED_VALUE",
+    ) -> Dict[str, List[List[Any]]]:
+        """
+        Get data for several ranges in a single API request.
+
+        Args:
+            spreadsheet_id: The spreadsheet ID or URL
+            ranges: Sheet names or A1 ranges (e.g., "costs" or "costs!1:20")
+            value_render_option: How to render values ("UNFORMATTED_VALUE", "FORMATTED_VALUE", "FORMULA")
+
+        Returns:
+            Dictionary mapping each requested range to its list of rows
+        """
+        if not ranges:
+            return {}
+
+        try:
+            spreadsheet_id = self._extract_spreadsheet_id(spreadsheet_id)
+
+            loop = asyncio.get_event_loop()
+            response = await loop.run_in_executor(
+                None,
+                lambda: self.service.spreadsheets()
+                .values()
+                .batchGet(
+                    spreadsheetId=spreadsheet_id,
+                    ranges=ranges,
+                    valueRenderOption=value_render_option,
+                )
+                .execute(),
+            )
+
+            # valueRanges come back in request order, but with normalised range
+            # names (e.g. "'costs'!A1:K13000"), so key them by the requested range
+            value_ranges = response.get("valueRanges", [])
+            results = {
+                requested: value_range.get("values", [])
+                for requested, value_range in zip(ranges, value_ranges)
+            }
+            logger.info(f"Retrieved {len(results)} ranges in one batch request")
+            return results
+
+        except HttpError as error:
+            logger.error(f"Error batch getting sheet data: {error}")
+            raise GoogleSheetsError(f"Failed to batch get sheet data: {error}")
+
     def _prepare_data_for_polars(
         self, data: List[List[Any]]
     ) -> Tuple[List[str], List[List[Any]]]:
@@ -96,6 +96,27 @@ class PnLGoogleSheetsClient(BaseGoogleSheetsClient):
         # Get raw data
         raw_data = await self.get_sheet_data(spreadsheet_id, sheet_name, range_name)
 
+        return self._parse_raw_data(raw_data, sheet_name, parser_type, config)
+
+    def _parse_raw_data(
+        self,
+        raw_data: List[List[Any]],
+        sheet_name: str,
+        parser_type: Optional[str] = None,
+        config: Optional[ParsingConfig] = None,
+    ) -> ParsedTable:
+        """
+        Parse and validate raw sheet rows that have already been fetched.
+
+        Args:
+            raw_data: Rows returned by the Sheets API
+            sheet_name: Name of the sheet the rows came from
+            parser_type: Type of parser to use
+            config: Custom parsing configuration
+
+        Returns:
+            ParsedTable with data and metadata
+        """
         if not raw_data:
             raise ValueError(f"No data found in sheet {sheet_name}")
 
@@ -114,6 +135,43 @@ class PnLGoogleSheetsClient(BaseGoogleSheetsClient):
 
         return parsed_table
 
+    async def _fetch_ranges(
+        self, spreadsheet_id: str, ranges: List[str]
+    ) -> Dict[str, Union[List[List[Any]], Exception]]:
+        """
+        Fetch several ranges, with one batchGet request where possible.
+
+        batchGet fails the whole request if any one sheet or range is missing,
+        so when it fails each range is fetched on its own and only the ranges
+        that fail carry their error.
+
+        Args:
+            spreadsheet_id: The spreadsheet ID or URL
+            ranges: Sheet names or A1 ranges (e.g., "costs" or "costs!1:20")
+
+        Returns:
+            Dictionary mapping each range to its rows, or to the exception
+            raised while fetching it
+        """
+        try:
+            return await self.batch_get(spreadsheet_id, ranges)
+        except Exception as e:
+            logger.warning(
+                f"Batch fetch failed, fetching {len(ranges)} ranges separately: {e}"
+            )
+
+        # One at a time: the underlying HTTP client is not thread-safe
+        results: Dict[str, Union[List[List[Any]], Exception]] = {}
+        for range_name in ranges:
+            sheet_name = range_name.split("!", 1)[0]
+            try:
+                results[range_name] = await self.get_sheet_data(
+                    spreadsheet_id, sheet_name, range_name=range_name
+                )
+            except Exception as e:
+                results[range_name] = e
+        return results
+
     async def extract_pnl_table(
         self, spreadsheet_id: str, table_name: str, engine: str = "polars"
     ) -> Union[pl.DataFrame, pd.DataFrame]:
@@ -136,6 +194,22 @@ class PnLGoogleSheetsClient(BaseGoogleSheetsClient):
         # Extract using specialized parser
         parsed_table = await self.get_sheet_as_parsed_table(spreadsheet_id, table_name)
 
+        return self._pnl_table_to_engine(parsed_table, table_name, engine)
+
+    def _pnl_table_to_engine(
+        self, parsed_table: ParsedTable, table_name: str, engine: str
+    ) -> Union[pl.DataFrame, pd.DataFrame]:
+        """
+        Log a parsed P&L table and convert it to the requested engine.
+
+        Args:
+            parsed_table: Parsed P&L table
+            table_name: Name of the P&L table
+            engine: DataFrame engine ('polars' or 'pandas')
+
+        Returns:
+            DataFrame with the extracted table data
+        """
         # Log extraction results
         logger.info(
             f"Extracted P&L table '{table_name}': {parsed_table.row_count} rows × "
@@ -170,6 +244,11 @@ class PnLGoogleSheetsClient(BaseGoogleSheetsClient):
         """
         Extract multiple P&L tables efficiently.
 
+        All requested sheets are fetched with a single batchGet request and
+        then parsed locally, so the cost is one API round-trip rather than one
+        per table. If the batch fails (e.g. one sheet is missing) the sheets
+        are fetched one by one, so only the missing table fails.
+
         Args:
             spreadsheet_id: The P&L spreadsheet ID
             tables: List of table names to extract (None = all configured tables)
@@ -193,10 +272,24 @@ class PnLGoogleSheetsClient(BaseGoogleSheetsClient):
             f"Extracting {len(tables)} P&L tables from spreadsheet {spreadsheet_id}"
         )
 
+        # Unknown tables would fail the whole batch request, so drop them first
+        known_tables = []
         for table_name in tables:
+            if table_name in PNL_PARSER_CONFIGS:
+                known_tables.append(table_name)
+            else:
+                logger.error(f"❌ Failed to extract {table_name}: unknown P&L table")
+                extraction_stats["failed"] += 1
+
+        raw_tables = await self._fetch_ranges(spreadsheet_id, known_tables)
+
+        for table_name, raw_data in raw_tables.items():
             try:
                 logger.info(f"Extracting table: {table_name}")
-                df = await self.extract_pnl_table(spreadsheet_id, table_name, engine)
+                if isinstance(raw_data, Exception):
+                    raise raw_data
+                parsed_table = self._parse_raw_data(raw_data, table_name)
+                df = self._pnl_table_to_engine(parsed_table, table_name, engine)
                 results[table_name] = df
 
                 extraction_stats["successful"] += 1
@@ -301,14 +394,21 @@ class PnLGoogleSheetsClient(BaseGoogleSheetsClient):
 
         results = {}
 
+        # Fetch the header and sample rows of every known table in one request
+        sample_ranges = {
+            table_name: f"{table_name}!1:20"  # First 20 rows
+            for table_name in tables
+            if table_name in PNL_PARSER_CONFIGS
+        }
+        samples = await self._fetch_ranges(
+            spreadsheet_id, list(sample_ranges.values())
+        )
+
         for table_name in tables:
             try:
-                # Get just header and sample data
-                raw_data = await self.get_sheet_data(
-                    spreadsheet_id,
-                    table_name,
-                    range_name=f"{table_name}!1:20",  # First 20 rows
-                )
+                raw_data = samples[sample_ranges[table_name]]
+                if isinstance(raw_data, Exception):
+                    raise raw_data
 
                 # Use the parser for configuration only
                 config = PNL_PARSER_CONFIGS[table_name]
@@ -3,15 +3,30 @@ Helper functions for the SQL Query Explorer page.
 """
 
 import duckdb
+import polars as pl
 import streamlit as st
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 import re
 from datetime import datetime
+from functools import lru_cache
+
+from jinja2 import Environment, Template
 
 # Type alias for a query definition
 QueryDefinition = Dict[str, Any]
 
+# Shared Jinja2 environment for rendering query templates
+_JINJA_ENV = Environment()
+
+
+@lru_cache(maxsize=256)
+def _compile_template(query: str) -> Template:
+    """
+    Compiles a Jinja2 query template, caching the result by its source text.
+    """
+    return _JINJA_ENV.from_string(query)
+
 
 @st.cache_resource
 def get_motherduck_connection() -> duckdb.DuckDBPyConnection:
@@ -99,8 +114,10 @@ def get_all_queries(
     custom_queries = []
     if _conn:
         try:
-            custom_queries_df = _conn.execute("SELECT * FROM custom_queries").fetchdf()
-            for _, row in custom_queries_df.iterrows():
+            custom_queries_df = pl.from_arrow(
+                _conn.execute("SELECT * FROM custom_queries").fetch_arrow_table()
+            )
+            for row in custom_queries_df.iter_rows(named=True):
                 custom_queries.append(
                     {
                         "name": row["name"],
@@ -123,13 +140,14 @@ def get_all_queries(
     # 3. Load usage log for the current user to get timestamps for pre-defined queries
     if _conn:
         try:
-            usage_log_df = _conn.execute(
-                f"SELECT query_name, last_used_at FROM query_usage_log WHERE user_email = '{user_email}'"
-            ).fetchdf()
-            usage_map = {
-                row["query_name"]: row["last_used_at"]
-                for _, row in usage_log_df.iterrows()
-            }
+            usage_log_df = pl.from_arrow(
+                _conn.execute(
+                    f"SELECT query_name, last_used_at FROM query_usage_log WHERE user_email = '{user_email}'"
+                ).fetch_arrow_table()
+            )
+            usage_map = dict(
+                zip(usage_log_df["query_name"], usage_log_df["last_used_at"])
+            )
             for query in predefined_queries:
                 if query["id"] in usage_map:
                     query["last_used_at"] = usage_map[query["id"]]
@@ -168,10 +186,7 @@ def execute_query(
     final_query = query
     if template_vars:
         try:
-            from jinja2 import Template
-
-            template = Template(query)
-            final_query = template.render(template_vars)
+            final_query = _compile_template(query).render(template_vars)
         except Exception as e:
             return f"Jinja2 template rendering error: {e}"
 
@@ -234,10 +249,12 @@ def save_custom_query(
     except Exception as e:
         st.warning(f"Could not perform pre-flight check: {e}")
 
-    # --- Validation Step 2: Live execution check ---
-    # For templates, we need mock data. This is a simplified approach.
-    mock_vars = {}
+    # --- Validation Step 2: Plan the query without running it ---
+    # EXPLAIN parses and binds the query against the schema but does not scan
+    # any rows. For templates, we need mock data. This is a simplified approach.
+    validation_sql = sql
     if is_template:
+        mock_vars = {}
         variables = re.findall(r"\{\{\s*(\w+)\s*\}\}", sql)
         for var in variables:
             if "date" in var.lower():
@@ -246,10 +263,18 @@ def save_custom_query(
                 mock_vars[var] = "QU-0000"  # A plausible dummy value
             else:
                 mock_vars[var] = 1  # Default to a number
+        try:
+            validation_sql = _compile_template(sql).render(mock_vars)
+        except Exception as e:
+            return (
+                False,
+                f"Query failed validation: Jinja2 template rendering error: {e}",
+            )
 
-    validation_result = execute_query(_conn, sql, mock_vars)
-    if isinstance(validation_result, str):
-        return False, f"Query failed validation: {validation_result}"
+    try:
+        _conn.execute(f"EXPLAIN {validation_sql}")
+    except Exception as e:
+        return False, f"Query failed validation: {e}"
 
     # --- Save to database ---
     try:
@@ -257,23 +282,14 @@ def save_custom_query(
 
         query_id = uuid.uuid4()
         _conn.execute(
-            "INSERT INTO custom_queries (id, name, sql_template, is_template, created_by, modified_by, modified_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            [query_id, name, sql, is_template, user_email, user_email, datetime.now()],
+            """
+            INSERT INTO custom_queries (id, name, sql_template, is_template, created_by, created_at, modified_by, modified_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, NOW(), ?, NOW(), NOW())
+            """,
+            [query_id, name, sql, is_template, user_email, user_email],
         )
-        # Basic validation passed, now try to save to the database
-        try:
-            query_id = uuid.uuid4()
-            _conn.execute(
-                """
-                INSERT INTO custom_queries (id, name, sql_template, is_template, created_by, created_at, last_used_at)
-                VALUES (?, ?, ?, ?, ?, NOW(), NOW())
-                """,
-                [query_id, name, sql, is_template, user_email],
-            )
-            return True, f"Query saved successfully with ID: {query_id}"
-        except duckdb.Error as e:
-            return False, f"Failed to save query: {e}"
-        except Exception as e:
-            return False, f"An unexpected error occurred during save: {e}"
+        return True, f"Query saved successfully with ID: {query_id}"
+    except duckdb.Error as e:
+        return False, f"Failed to save query: {e}"
     except Exception as e:
         return False, f"An unexpected error occurred during save: {e}"
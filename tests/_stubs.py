@@ -0,0 +1,38 @@
+"""
+Lightweight stand-ins for the P&L Google Sheets client used in extraction tests.
+
+Plain classes avoid the attribute-recording overhead of AsyncMock/MagicMock
+for tests that only need canned responses.
+"""
+
+from typing import List, Optional
+
+import polars as pl
+
+
+class StubSheet:
+    """Minimal spreadsheet metadata as returned by `list_spreadsheets`."""
+
+    def __init__(
+        self, title: str = "Project P&L Report", spreadsheet_id: str = "test_id"
+    ):
+        self.title = title
+        self.spreadsheet_id = spreadsheet_id
+
+
+class StubClient:
+    """P&L client stub returning a fixed DataFrame for every table request."""
+
+    def __init__(
+        self,
+        df: Optional[pl.DataFrame] = None,
+        spreadsheets: Optional[List[StubSheet]] = None,
+    ):
+        self._df = df
+        self._spreadsheets = [StubSheet()] if spreadsheets is None else spreadsheets
+
+    async def list_spreadsheets(self) -> List[StubSheet]:
+        return self._spreadsheets
+
+    async def extract_pnl_table(self, *args, **kwargs) -> pl.DataFrame:
+        return self._df
@@ -0,0 +1,50 @@
+"""
+Shared setup for all test packages.
+
+Provides a minimal stand-in for the `streamlit` module so helper modules can be
+imported without a Streamlit runtime or `.streamlit/secrets.toml`. It is
+installed here, before any test module is imported, so unit and integration
+tests share the same stub whether or not they run in separate xdist workers,
+and whether or not the real package is installed.
+"""
+
+import functools
+import sys
+import types
+
+
+def _cache_decorator(func=None, **_kwargs):
+    """Pass-through replacement for st.cache_data / st.cache_resource.
+
+    Supports both the bare (`@st.cache_data`) and called
+    (`@st.cache_data(ttl=600)`) forms, and keeps `__wrapped__` so tests can
+    reach the undecorated function.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
+
+
+def _noop(*_args, **_kwargs):
+    return None
+
+
+if "streamlit" not in sys.modules:
+    _streamlit = types.ModuleType("streamlit")
+    _streamlit.cache_data = _cache_decorator
+    _streamlit.cache_resource = _cache_decorator
+    _streamlit.session_state = {}
+    # elt.tr2duck reads these at import time; empty values never connect
+    _streamlit.secrets = {
+        "motherduck": {"token": "", "db": ""},
+        "trello": {"api_key": "", "api_token": ""},
+    }
+    _streamlit.error = _noop
+    _streamlit.warning = _noop
+    sys.modules["streamlit"] = _streamlit
@@ -3,12 +3,6 @@ import duckdb
 from pathlib import Path
 import os
 
-# Mock streamlit before importing helpers
-from unittest.mock import MagicMock
-import sys
-
-sys.modules["streamlit"] = MagicMock()
-
 from enviroflow_app.helpers.query_helpers import save_custom_query, get_all_queries
 
 
@@ -44,6 +38,12 @@ def test_save_and_get_custom_query(db_connection):
     # Save the query
     success, msg = save_custom_query(db_connection, query_name, query_sql, user)
     assert success, f"Save failed: {msg}"
+    modified_by, modified_at = db_connection.execute(
+        "SELECT modified_by, modified_at FROM custom_queries WHERE name = ?",
+        [query_name],
+    ).fetchone()
+    assert modified_by == user
+    assert modified_at is not None
 
     # Retrieve all queries
     # Create a dummy predefined query file for get_all_queries to find
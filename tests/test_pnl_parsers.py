@@ -348,6 +348,92 @@ async def test_extract_all_pnl_tables(pnl_client):
         assert len(df.columns) > 0, f"Table {table_name} should have columns"
 
 
+@pytest.mark.asyncio
+async def test_extract_all_pnl_tables_single_batch_request():
+    """Test that multiple tables are fetched with one batchGet round-trip."""
+    from unittest.mock import MagicMock
+
+    client = object.__new__(PnLGoogleSheetsClient)
+    client._parser_cache = {}
+    client.service = MagicMock()
+    batch_get = client.service.spreadsheets.return_value.values.return_value.batchGet
+    batch_get.return_value.execute.return_value = {
+        "valueRanges": [
+            {"range": "'xero_name'!A1:B3", "values": [["a", "b"], ["1", "2"]]},
+            {"range": "'sales'!A1:B3", "values": [["c", "d"], ["3", "4"]]},
+        ]
+    }
+
+    results = await client.extract_all_pnl_tables(
+        TEST_SPREADSHEET_ID, tables=["xero_name", "sales", "not_a_table"]
+    )
+
+    batch_get.assert_called_once()
+    assert batch_get.call_args.kwargs["ranges"] == ["xero_name", "sales"]
+    assert set(results) == {"xero_name", "sales"}
+
+
+def _client_with_missing_sheet(missing: str):
+    """Build a client whose batchGet fails because the `missing` sheet is absent."""
+    from unittest.mock import MagicMock
+
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    def _error():
+        return HttpError(
+            httplib2.Response({"status": 400}),
+            f"Unable to parse range: {missing}".encode(),
+        )
+
+    def _get(spreadsheetId, range, valueRenderOption):
+        request = MagicMock()
+        if range.split("!", 1)[0] == missing:
+            request.execute.side_effect = _error()
+        else:
+            request.execute.return_value = {"values": [["a", "b"], ["1", "2"]]}
+        return request
+
+    client = object.__new__(PnLGoogleSheetsClient)
+    client._parser_cache = {}
+    client.service = MagicMock()
+    values = client.service.spreadsheets.return_value.values.return_value
+    values.batchGet.return_value.execute.side_effect = _error()
+    values.get.side_effect = _get
+    return client, values
+
+
+@pytest.mark.asyncio
+async def test_extract_all_pnl_tables_missing_sheet_fails_alone():
+    """Test a missing sheet fails only its own table when batchGet fails."""
+    client, values = _client_with_missing_sheet("sales")
+
+    results = await client.extract_all_pnl_tables(
+        TEST_SPREADSHEET_ID, tables=["xero_name", "sales"]
+    )
+
+    values.batchGet.assert_called_once()
+    assert values.get.call_count == 2
+    assert set(results) == {"xero_name"}
+
+
+@pytest.mark.asyncio
+async def test_validate_pnl_extraction_missing_sheet_fails_alone():
+    """Test validation still reports the tables that exist when one is missing."""
+    client, values = _client_with_missing_sheet("quotes")
+
+    results = await client.validate_pnl_extraction(
+        TEST_SPREADSHEET_ID, tables=["xero_name", "quotes"]
+    )
+
+    assert values.get.call_args_list[0].kwargs["range"] == "xero_name!1:20"
+    assert results["xero_name"]["table_exists"] is True
+    assert results["xero_name"]["sample_row_count"] == 2
+    assert results["quotes"]["table_exists"] is False
+    assert "quotes" in results["quotes"]["error"]
+    assert "xero_name" not in results["quotes"]["error"]
+
+
 @pytest.mark.asyncio
 async def test_extract_pnl_constants_tables(pnl_client):
     """Test extracting multiple tables from constants sheet."""
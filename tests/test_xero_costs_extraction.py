@@ -1,7 +1,7 @@
 """
 Tests for enhanced xero-costs data extraction functionality.
 
-Tests the extract_xero_costs function including:
+Tests the extract_xero_costs function and its async core including:
 - Google Sheets integration with fallback
 - Excel date conversion (serial numbers to Date type)
 - Enhanced column typing (Float64 for financial, String for text)
@@ -13,13 +13,41 @@ Tests the extract_xero_costs function including:
 import pytest
 import polars as pl
 from datetime import date
-from unittest.mock import AsyncMock, MagicMock, patch
-
-from enviroflow_app.cli.operations.extraction_ops import extract_xero_costs
+from unittest.mock import patch
+
+from enviroflow_app import gsheets
+from enviroflow_app.cli.operations import extraction_ops
+from enviroflow_app.cli.operations.extraction_ops import (
+    extract_xero_costs,
+    extract_xero_costs_async,
+)
+
+from _stubs import StubClient
+
+
+# Explicit dtypes for mock sheet data so DataFrame construction skips schema
+# inference; columns missing from a given frame are ignored
+_MOCK_SCHEMA = {
+    "Date": pl.Int64,
+    "Account": pl.String,
+    "Description": pl.String,
+    "Supplier": pl.String,
+    "Debit": pl.Float64,
+    "Credit": pl.Float64,
+    "Running Balance": pl.Float64,
+    "Gross": pl.Float64,
+    "GST": pl.Float64,
+    "amount": pl.Float64,
+    "Reference": pl.String,
+}
 
 
 class TestXeroCostsExtraction:
-    """Test suite for enhanced xero-costs data extraction."""
+    """Test suite for enhanced xero-costs data extraction.
+
+    Fixtures are function-scoped and every test builds its own mocks, so the
+    suite is safe to distribute across pytest-xdist workers.
+    """
 
     @pytest.fixture
     def mock_costs_data(self):
@@ -55,7 +83,9 @@ class TestXeroCostsExtraction:
                 "GST": [25.05, 12.58, 150.00, 30.00, 85.03],
                 "amount": [225.45, 113.17, 1350.00, 269.99, 765.22],
                 "Reference": ["PO001", "FUEL02", "EQUIP03", "LIC04", "CONF05"],
-            }
+            },
+            schema_overrides=_MOCK_SCHEMA,
+            strict=False,
         )
 
     @pytest.fixture
@@ -67,30 +97,35 @@ class TestXeroCostsExtraction:
                 "Account": ["Test Account 1", "Test Account 2", "Test Account 3"],
                 "Debit": [100.0, 200.0, 300.0],
                 "Credit": [0.0, 0.0, 0.0],
-            }
+            },
+            schema_overrides={**_MOCK_SCHEMA, "Date": pl.String},
+            strict=False,
         )
 
+    @pytest.fixture
+    def fallback_costs_file(self, tmp_path, monkeypatch):
+        """Create a placeholder fallback costs file and start with a cold cache."""
+        monkeypatch.chdir(tmp_path)
+        costs_file = tmp_path / "Data" / "pnl_data" / "costs.parquet"
+        costs_file.parent.mkdir(parents=True)
+        costs_file.touch()
+        extraction_ops._read_costs_parquet.cache_clear()
+        yield costs_file
+        extraction_ops._read_costs_parquet.cache_clear()
+
     @pytest.mark.asyncio
     async def test_xero_costs_extraction_success(self, mock_costs_data):
         """Test successful xero-costs extraction with proper typing and date conversion."""
 
-        # Mock the Google Sheets client
-        mock_client = AsyncMock()
-        mock_spreadsheet = MagicMock()
-        mock_spreadsheet.title = "Project P&L Report"
-        mock_spreadsheet.spreadsheet_id = "test_id"
-
-        mock_client.list_spreadsheets.return_value = [mock_spreadsheet]
-        mock_client.extract_pnl_table.return_value = mock_costs_data
+        # Stub the Google Sheets client
+        stub_client = StubClient(mock_costs_data)
 
         # Mock the save function to avoid actual file/database operations
         with (
-            patch(
-                "enviroflow_app.cli.operations.extraction_ops._save_dataframe"
-            ) as mock_save,
-            patch("enviroflow_app.gsheets.create_pnl_client", return_value=mock_client),
+            patch.object(extraction_ops, "_save_dataframe", autospec=True) as mock_save,
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
         ):
-            result = extract_xero_costs()
+            result = await extract_xero_costs_async()
 
             # Verify the result structure
             assert "xero_costs" in result
@@ -113,10 +148,6 @@ class TestXeroCostsExtraction:
             assert schema["amount"] == pl.Float64
             assert schema["Reference"] == pl.String
 
-            # Verify date conversion (Excel serial 44562 should convert properly)
-            dates = costs_df["Date"].to_list()
-            assert all(isinstance(d, date) for d in dates)
-
             # Verify no null dates remain
             assert costs_df.filter(pl.col("Date").is_null()).height == 0
 
@@ -127,23 +158,24 @@ class TestXeroCostsExtraction:
             assert len(call_args[0][0]) == 4  # DataFrame length
 
     @pytest.mark.asyncio
-    async def test_xero_costs_fallback_to_local_file(self, mock_fallback_costs_data):
+    async def test_xero_costs_fallback_to_local_file(
+        self, mock_fallback_costs_data, fallback_costs_file
+    ):
         """Test fallback to local file when Google Sheets fails."""
 
         # Mock Google Sheets failure
         with (
-            patch(
-                "enviroflow_app.gsheets.create_pnl_client",
+            patch.object(
+                gsheets,
+                "create_pnl_client",
                 side_effect=Exception("Connection failed"),
             ),
-            patch(
-                "polars.read_parquet", return_value=mock_fallback_costs_data
+            patch.object(
+                pl, "read_parquet", return_value=mock_fallback_costs_data
             ) as mock_read,
-            patch(
-                "enviroflow_app.cli.operations.extraction_ops._save_dataframe"
-            ) as mock_save,
+            patch.object(extraction_ops, "_save_dataframe", autospec=True) as mock_save,
         ):
-            result = extract_xero_costs()
+            result = await extract_xero_costs_async()
 
             # Verify fallback was used
             assert "xero_costs" in result
@@ -158,21 +190,49 @@ class TestXeroCostsExtraction:
             # Verify save was still called
             mock_save.assert_called_once()
 
+    def test_fallback_file_read_is_cached(self, fallback_costs_file):
+        """Test repeated fallback extractions reuse the parsed parquet file."""
+
+        cached_data = pl.DataFrame(
+            {
+                "Date": [44927, 44928],
+                "Account": ["Test Account 1", "Test Account 2"],
+                "Debit": ["1,000.00", "250.00"],
+            },
+            schema_overrides={**_MOCK_SCHEMA, "Debit": pl.String},
+            strict=False,
+        )
+
+        with (
+            patch.object(
+                gsheets,
+                "create_pnl_client",
+                side_effect=Exception("Connection failed"),
+            ),
+            patch.object(pl, "read_parquet", return_value=cached_data) as mock_read,
+            patch.object(extraction_ops, "_save_dataframe", autospec=True),
+        ):
+            first = extract_xero_costs()["xero_costs"]
+            second = extract_xero_costs()["xero_costs"]
+
+            assert mock_read.call_count == 1
+            assert len(first) == 2
+            assert first.equals(second)
+
     @pytest.mark.asyncio
-    async def test_xero_costs_no_spreadsheet_found(self):
+    async def test_xero_costs_no_spreadsheet_found(self, fallback_costs_file):
         """Test handling when P&L spreadsheet is not found."""
 
-        mock_client = AsyncMock()
-        mock_client.list_spreadsheets.return_value = []
+        stub_client = StubClient(spreadsheets=[])
 
         # Mock fallback file exists
         with (
-            patch("enviroflow_app.gsheets.create_pnl_client", return_value=mock_client),
-            patch("polars.read_parquet") as mock_read,
-            patch("enviroflow_app.cli.operations.extraction_ops._save_dataframe"),
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
+            patch.object(pl, "read_parquet") as mock_read,
+            patch.object(extraction_ops, "_save_dataframe", autospec=True),
         ):
             # Should fall back to local file
-            extract_xero_costs()
+            await extract_xero_costs_async()
 
             # Verify fallback was attempted
             mock_read.assert_called()
@@ -188,49 +248,114 @@ class TestXeroCostsExtraction:
                     44197,
                     1,
                     43831,
-                ],  # 2022-12-01, 2020-12-31, 1900-01-01, 2019-11-26
+                ],  # 2023-01-01, 2021-01-01, 1899-12-31, 2020-01-01
                 "Account": ["Test1", "Test2", "Test3", "Test4"],
                 "Debit": [100.0, 200.0, 300.0, 400.0],
-            }
+            },
+            schema_overrides=_MOCK_SCHEMA,
+            strict=False,
         )
 
-        mock_client = AsyncMock()
-        mock_spreadsheet = MagicMock()
-        mock_spreadsheet.title = "Project P&L Report"
-        mock_spreadsheet.spreadsheet_id = "test_id"
+        stub_client = StubClient(test_data)
 
-        mock_client.list_spreadsheets.return_value = [mock_spreadsheet]
-        mock_client.extract_pnl_table.return_value = test_data
+        with (
+            patch.object(extraction_ops, "_save_dataframe", autospec=True),
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
+        ):
+            result = extract_xero_costs()
+            costs_df = result["xero_costs"]
+
+            # Verify specific date conversions
+            for expected in [
+                date(2023, 1, 1),  # 44927
+                date(2021, 1, 1),  # 44197
+                date(1899, 12, 31),  # 1
+                date(2020, 1, 1),  # 43831
+            ]:
+                assert costs_df.filter(pl.col("Date") == expected).height >= 1
+
+    def test_filter_valid_dates_leaves_other_columns_uncast(self):
+        """Test null-date rows are dropped before any other column is cast."""
+
+        test_data = pl.DataFrame(
+            {
+                "Date": [44927, None, 44929],
+                "Debit": ["1,000.00", "2,000.00", "3,000.00"],
+            },
+            schema_overrides={**_MOCK_SCHEMA, "Debit": pl.String},
+            strict=False,
+        )
+
+        filtered = extraction_ops._filter_valid_dates(test_data)
+
+        assert filtered.schema["Date"] == pl.Date
+        assert filtered.schema["Debit"] == pl.String
+        assert filtered["Debit"].to_list() == ["1,000.00", "3,000.00"]
+
+    def test_date_conversion_integer_fastpath(self, monkeypatch):
+        """Test integer Excel serials convert without any string date parsing."""
+
+        test_data = pl.DataFrame(
+            {
+                "Date": [44927, 44928, 44929],
+                "Account": ["Test1", "Test2", "Test3"],
+            },
+            schema_overrides=_MOCK_SCHEMA,
+            strict=False,
+        )
+
+        def _fail_strptime(*args, **kwargs):
+            raise AssertionError("integer serials must not be parsed as strings")
+
+        monkeypatch.setattr(
+            "polars.expr.string.ExprStringNameSpace.strptime", _fail_strptime
+        )
+
+        stub_client = StubClient(test_data)
 
         with (
-            patch("enviroflow_app.cli.operations.extraction_ops._save_dataframe"),
-            patch("enviroflow_app.gsheets.create_pnl_client", return_value=mock_client),
+            patch.object(extraction_ops, "_save_dataframe", autospec=True),
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
         ):
             result = extract_xero_costs()
             costs_df = result["xero_costs"]
 
-            dates = costs_df["Date"].to_list()
+            assert costs_df.schema["Date"] == pl.Date
+            assert costs_df["Date"].to_list() == [
+                date(2023, 1, 1),
+                date(2023, 1, 2),
+                date(2023, 1, 3),
+            ]
 
-            # Verify specific date conversions
-            assert date(2022, 12, 1) in dates  # 44927
-            assert date(2020, 12, 31) in dates  # 44197
-            assert date(1900, 1, 1) in dates  # 1
-            assert date(2019, 11, 26) in dates  # 43831
+    def test_date_conversion_string_path(self):
+        """Test text dates accept both serial numbers and ISO strings."""
+
+        test_data = pl.DataFrame({"Date": ["44927", "2022-01-01", "", "NULL", None]})
+
+        costs_df = extraction_ops._filter_valid_dates(test_data)
+
+        assert costs_df["Date"].to_list() == [date(2023, 1, 1), date(2022, 1, 1)]
+
+    def test_date_conversion_drops_invalid_serials(self):
+        """Test NaN and out-of-range serials become null instead of failing."""
+
+        float_data = pl.DataFrame({"Date": [44927.0, float("nan"), 1e15]})
+        text_data = pl.DataFrame({"Date": ["44927", "1e9", "1e30"]})
+
+        for test_data in (float_data, text_data):
+            costs_df = extraction_ops._filter_valid_dates(test_data)
+
+            assert costs_df.schema["Date"] == pl.Date
+            assert costs_df["Date"].to_list() == [date(2023, 1, 1)]
 
     def test_financial_column_typing_comprehensive(self, mock_costs_data):
         """Test comprehensive financial column typing."""
 
-        mock_client = AsyncMock()
-        mock_spreadsheet = MagicMock()
-        mock_spreadsheet.title = "Project P&L Report"
-        mock_spreadsheet.spreadsheet_id = "test_id"
-
-        mock_client.list_spreadsheets.return_value = [mock_spreadsheet]
-        mock_client.extract_pnl_table.return_value = mock_costs_data
+        stub_client = StubClient(mock_costs_data)
 
         with (
-            patch("enviroflow_app.cli.operations.extraction_ops._save_dataframe"),
-            patch("enviroflow_app.gsheets.create_pnl_client", return_value=mock_client),
+            patch.object(extraction_ops, "_save_dataframe", autospec=True),
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
         ):
             result = extract_xero_costs()
             costs_df = result["xero_costs"]
@@ -274,20 +399,16 @@ class TestXeroCostsExtraction:
                 ],  # Various null representations
                 "Account": ["A", "B", "C", "D", "E", "F"],
                 "Debit": [100.0, 200.0, 300.0, 400.0, 500.0, 600.0],
-            }
+            },
+            schema_overrides=_MOCK_SCHEMA,
+            strict=False,
         )
 
-        mock_client = AsyncMock()
-        mock_spreadsheet = MagicMock()
-        mock_spreadsheet.title = "Project P&L Report"
-        mock_spreadsheet.spreadsheet_id = "test_id"
-
-        mock_client.list_spreadsheets.return_value = [mock_spreadsheet]
-        mock_client.extract_pnl_table.return_value = test_data
+        stub_client = StubClient(test_data)
 
         with (
-            patch("enviroflow_app.cli.operations.extraction_ops._save_dataframe"),
-            patch("enviroflow_app.gsheets.create_pnl_client", return_value=mock_client),
+            patch.object(extraction_ops, "_save_dataframe", autospec=True),
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
         ):
             result = extract_xero_costs()
             costs_df = result["xero_costs"]
@@ -305,21 +426,13 @@ class TestXeroCostsExtraction:
 
         config = OutputConfig(destination=OutputDestination.BOTH)
 
-        mock_client = AsyncMock()
-        mock_spreadsheet = MagicMock()
-        mock_spreadsheet.title = "Project P&L Report"
-        mock_spreadsheet.spreadsheet_id = "test_id"
-
-        mock_client.list_spreadsheets.return_value = [mock_spreadsheet]
-        mock_client.extract_pnl_table.return_value = mock_costs_data
+        stub_client = StubClient(mock_costs_data)
 
         with (
-            patch(
-                "enviroflow_app.cli.operations.extraction_ops._save_dataframe"
-            ) as mock_save,
-            patch("enviroflow_app.gsheets.create_pnl_client", return_value=mock_client),
+            patch.object(extraction_ops, "_save_dataframe", autospec=True) as mock_save,
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
         ):
-            extract_xero_costs(config)
+            await extract_xero_costs_async(config)
 
             # Verify save was called with the config
             mock_save.assert_called_once()
@@ -338,22 +451,16 @@ class TestXeroCostsExtraction:
                 "Description": [f"Transaction_{i}" for i in range(n_records)],
                 "Debit": [float(100 + i) for i in range(n_records)],
                 "Credit": [None] * n_records,
-            }
+            },
+            schema_overrides=_MOCK_SCHEMA,
+            strict=False,
         )
 
-        mock_client = AsyncMock()
-        mock_spreadsheet = MagicMock()
-        mock_spreadsheet.title = "Project P&L Report"
-        mock_spreadsheet.spreadsheet_id = "test_id"
-
-        mock_client.list_spreadsheets.return_value = [mock_spreadsheet]
-        mock_client.extract_pnl_table.return_value = test_data
+        stub_client = StubClient(test_data)
 
         with (
-            patch(
-                "enviroflow_app.cli.operations.extraction_ops._save_dataframe"
-            ) as mock_save,
-            patch("enviroflow_app.gsheets.create_pnl_client", return_value=mock_client),
+            patch.object(extraction_ops, "_save_dataframe", autospec=True) as mock_save,
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
         ):
             result = extract_xero_costs()
             costs_df = result["xero_costs"]
@@ -383,20 +490,16 @@ class TestXeroCostsExtraction:
                 "GST": [50.0, 100.0],
                 "amount": [450.0, 900.0],
                 "Reference": ["EXP001", "REV001"],
-            }
+            },
+            schema_overrides=_MOCK_SCHEMA,
+            strict=False,
         )
 
-        mock_client = AsyncMock()
-        mock_spreadsheet = MagicMock()
-        mock_spreadsheet.title = "Project P&L Report"
-        mock_spreadsheet.spreadsheet_id = "test_id"
-
-        mock_client.list_spreadsheets.return_value = [mock_spreadsheet]
-        mock_client.extract_pnl_table.return_value = legacy_structure_data
+        stub_client = StubClient(legacy_structure_data)
 
         with (
-            patch("enviroflow_app.cli.operations.extraction_ops._save_dataframe"),
-            patch("enviroflow_app.gsheets.create_pnl_client", return_value=mock_client),
+            patch.object(extraction_ops, "_save_dataframe", autospec=True),
+            patch.object(gsheets, "create_pnl_client", return_value=stub_client),
         ):
             result = extract_xero_costs()
             costs_df = result["xero_costs"]
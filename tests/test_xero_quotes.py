@@ -0,0 +1,196 @@
+"""
+Tests for building the Xero quote lines table.
+
+Covers the line percentage read from each line description by
+build_quote_lines_df, including descriptions without a percentage, and the
+parse warnings under the Xero app's logging config, reading multi-page
+quote dumps from file, and the column types the quote tables are saved with.
+"""
+
+import json
+import logging
+import sys
+from logging.config import dictConfig
+from pathlib import Path
+
+import duckdb
+import pytest
+
+# the Xero app imports its modules from its own directory
+sys.path.append(str(Path(__file__).parents[1] / "xero"))
+
+import logging_settings
+from xero_quotes import (
+    Xero_Quote,
+    Xero_Quotes_List,
+    build_quote_lines_df,
+    from_file_read_quotes_list_multi_page_json,
+    quotes_arrow_table,
+    stream_quotes_list_multi_page_json,
+)
+
+
+def _quote(descriptions):
+    """Build a minimal serialized Xero quote with one line per description."""
+    line_items = []
+    for i, description in enumerate(descriptions):
+        line = {
+            "LineItemID": f"L{i}",
+            "Quantity": 1.0,
+            "UnitAmount": 10.0,
+            "LineAmount": 10.0,
+        }
+        if description is not None:
+            line["Description"] = description
+        line_items.append(line)
+    return {
+        "QuoteID": "Q1",
+        "QuoteNumber": "QU-0001",
+        "Reference": "Ref 1",
+        "Contact": {"ContactID": "C1", "Name": "Customer 1"},
+        "Status": "SENT",
+        "SubTotal": 100.0,
+        "DateString": "2023-01-01T00:00:00",
+        "UpdatedDateUTC": "/Date(1672531200000+0000)/",
+        "LineItems": line_items,
+    }
+
+
+class TestBuildQuoteLinesDf:
+    """Test suite for the quote lines table."""
+
+    @pytest.mark.parametrize(
+        "description, expected",
+        [
+            ("Retention 5%", 0.05),
+            ("100% complete", 1.0),
+            ("Stage 2 12.5% progress", 0.12),
+            ("x 33.3333%", 0.33),
+            ("Misc works", 1.0),
+            (None, 1.0),
+        ],
+    )
+    def test_line_pct_from_description(self, description, expected):
+        """Test each line's percentage, defaulting to 100% when there is none."""
+
+        df = build_quote_lines_df([Xero_Quote(_quote([description]))])
+
+        assert df["line_pct"].tolist() == [expected]
+
+    def test_line_pct_for_repeated_descriptions(self):
+        """Test lines sharing a description across quotes keep their order."""
+
+        descriptions = ["Retention 5%", None, "Retention 5%", "100% complete"]
+        quotes = [Xero_Quote(_quote(descriptions)), Xero_Quote(_quote([None]))]
+
+        df = build_quote_lines_df(quotes)
+
+        assert df["line_pct"].tolist() == [0.05, 1.0, 0.05, 1.0, 1.0]
+        assert df["line_id"].tolist() == ["L0", "L1", "L2", "L3", "L0"]
+
+
+class TestMultiPageJson:
+    """Test reading multi-page quote dumps from file."""
+
+    def test_stream_matches_full_read(self, tmp_path):
+        """Test streaming a dump page by page gives the same quotes as loading it."""
+
+        pytest.importorskip("ijson")
+
+        first = _quote(["Retention 5%", "x 33.3333%"])
+        second = dict(_quote([None]), QuoteID="Q2", QuoteNumber="QU-0002")
+        pages = {
+            "1": {"Quotes": [first, second]},
+            "2": {"Quotes": [dict(first, QuoteID="Q3", QuoteNumber="QU-0003")]},
+            "3": {"Quotes": []},
+        }
+        path = tmp_path / "xero_quotes_list.json"
+        path.write_text(json.dumps(pages))
+
+        streamed = stream_quotes_list_multi_page_json(str(path))
+        loaded = from_file_read_quotes_list_multi_page_json(str(path))
+
+        assert streamed == loaded
+        assert streamed[0] == 2
+        assert [q["QuoteNumber"] for q in streamed[1]] == [
+            "QU-0001",
+            "QU-0002",
+            "QU-0003",
+        ]
+        assert Xero_Quotes_List(streamed[1]).quotes_df.equals(
+            Xero_Quotes_List(loaded[1]).quotes_df
+        )
+
+
+class TestQuotesArrowTable:
+    """Test the column types the quote tables are saved to MotherDuck with."""
+
+    def test_dates_saved_as_millisecond_timestamps(self):
+        """Test created and updated keep the TIMESTAMP_MS type of earlier saves."""
+
+        quotes = Xero_Quotes_List([_quote(["Retention 5%", None])])
+        table_to_save = quotes_arrow_table(quotes.quotes_df)
+
+        conn = duckdb.connect()
+        # the statement MotherDuck.save_table runs
+        conn.execute("CREATE OR REPLACE TABLE quotes AS SELECT * FROM table_to_save")
+        types = {
+            name: column_type
+            for name, column_type, *_ in conn.execute("DESCRIBE quotes").fetchall()
+        }
+
+        assert types["created"] == "TIMESTAMP_MS"
+        assert types["updated"] == "TIMESTAMP_MS"
+        assert types["quote_no"] == "VARCHAR"
+        assert types["line_total"] == "DOUBLE"
+        assert conn.execute("SELECT created FROM quotes").fetchall()[0][0].year == 2023
+
+
+@pytest.fixture
+def restore_logging():
+    """Put every logger back the way it was after a test applies dictConfig."""
+
+    def _state(logger):
+        return logger.level, list(logger.handlers), logger.propagate, logger.disabled
+
+    manager = logging.root.manager
+    saved = {
+        name: _state(logger)
+        for name, logger in manager.loggerDict.items()
+        if isinstance(logger, logging.Logger)
+    }
+    saved_root = _state(logging.root)
+
+    yield
+
+    for name, logger in list(manager.loggerDict.items()):
+        if not isinstance(logger, logging.Logger):
+            continue
+        level, handlers, propagate, disabled = saved.get(
+            name, (logging.NOTSET, [], True, False)
+        )
+        logger.setLevel(level)
+        logger.handlers[:] = handlers
+        logger.propagate = propagate
+        logger.disabled = disabled
+    level, handlers, _, _ = saved_root
+    logging.root.setLevel(level)
+    logging.root.handlers[:] = handlers
+
+
+class TestQuoteLogging:
+    """Test quote parse warnings reach the Xero app's logging setup."""
+
+    @pytest.mark.usefixtures("restore_logging")
+    def test_warning_logged_after_app_logging_config(self, caplog):
+        """Test the xero_quotes logger stays enabled once dictConfig has run."""
+
+        # app.py imports xero_quotes before applying its logging config
+        dictConfig(logging_settings.default_settings)
+
+        with caplog.at_level(logging.WARNING, logger="xero_quotes"):
+            quotes = Xero_Quotes_List([{"QuoteNumber": "QU-0002"}])
+
+        assert not logging.getLogger("xero_quotes").disabled
+        assert quotes.quotes_df is None
+        assert "failed to read: QU-0002" in caplog.text
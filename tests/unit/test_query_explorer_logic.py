@@ -1,15 +1,14 @@
+import duckdb
 import pytest
 from unittest.mock import MagicMock, patch, mock_open
 import pandas as pd
+import pyarrow as pa
 from datetime import datetime
 import polars as pl
-
-# Mock streamlit before importing helpers
-import sys
-
-sys.modules["streamlit"] = MagicMock()
+from polars.testing import assert_frame_equal
 
 from enviroflow_app.helpers.query_helpers import (
+    _compile_template,
     get_all_queries,
     execute_query,
     save_custom_query,
@@ -54,17 +53,20 @@ def test_get_all_queries_sorting_and_merging(mock_db_connection):
         }
     )
     mock_db_connection.execute.side_effect = [
-        MagicMock(fetchdf=lambda: custom_queries_df),  # For custom_queries
-        MagicMock(fetchdf=lambda: usage_log_df),  # For query_usage_log
+        MagicMock(
+            fetch_arrow_table=lambda: pa.Table.from_pandas(custom_queries_df)
+        ),  # For custom_queries
+        MagicMock(
+            fetch_arrow_table=lambda: pa.Table.from_pandas(usage_log_df)
+        ),  # For query_usage_log
     ]
 
     with patch("pathlib.Path.glob") as mock_glob, patch("builtins.open", m):
-        mock_glob.return_value = [
-            MagicMock(suffixes=[".sql"], name="predefined.sql", stem="predefined"),
-            MagicMock(
-                suffixes=[".sql", ".j2"], name="templated.sql.j2", stem="templated.sql"
-            ),
-        ]
+        predefined_path = MagicMock(suffixes=[".sql"], stem="predefined")
+        predefined_path.name = "predefined.sql"  # `name=` kwarg names the mock itself
+        templated_path = MagicMock(suffixes=[".sql", ".j2"], stem="templated.sql")
+        templated_path.name = "templated.sql.j2"
+        mock_glob.return_value = [predefined_path, templated_path]
 
         # Access the wrapped function to bypass the @st.cache_data decorator
         queries = get_all_queries.__wrapped__(mock_db_connection, "user@test.com")
@@ -83,12 +85,12 @@ def test_get_all_queries_sorting_and_merging(mock_db_connection):
 def test_execute_query_success(mock_db_connection):
     """Tests successful query execution."""
     expected_df = pl.DataFrame({"a": [1, 2], "b": [3, 4]})
-    mock_db_connection.execute.return_value.pl.return_value = expected_df.to_pandas()
+    mock_db_connection.execute.return_value.pl.return_value = expected_df
 
     result = execute_query(mock_db_connection, "SELECT * FROM test")
 
     assert isinstance(result, pl.DataFrame)
-    assert result.to_pandas().equals(expected_df.to_pandas())
+    assert_frame_equal(result, expected_df)
 
 
 def test_execute_query_template_render(mock_db_connection):
@@ -103,11 +105,31 @@ def test_execute_query_template_render(mock_db_connection):
     )
 
 
+def test_execute_query_template_compiled_once(mock_db_connection):
+    """Tests that repeated renders of the same template reuse the compiled template."""
+    query = "SELECT * FROM test WHERE val = '{{ my_val }}'"
+    _compile_template.cache_clear()
+
+    execute_query(mock_db_connection, query, {"my_val": "hello"})
+    execute_query(mock_db_connection, query, {"my_val": "world"})
+
+    cache_info = _compile_template.cache_info()
+    assert cache_info.misses == 1
+    assert cache_info.hits == 1
+    mock_db_connection.execute.assert_called_with(
+        "SELECT * FROM test WHERE val = 'world'"
+    )
+
+
 def test_save_custom_query_fails_validation(mock_db_connection):
-    """Tests that a query failing live validation is not saved."""
-    # Mock the execute_query function to return an error string
-    with patch("enviroflow_app.helpers.query_helpers.execute_query") as mock_execute:
-        mock_execute.return_value = "Database error: Table not found"
+    """Tests that a query failing EXPLAIN validation is not saved."""
+    mock_db_connection.execute.side_effect = [
+        duckdb.Error("Table not found"),
+        None,
+    ]
+
+    with patch("enviroflow_app.helpers.query_helpers.get_db_schema") as mock_get_schema:
+        mock_get_schema.return_value = {}
 
         success, message = save_custom_query(
             mock_db_connection,
@@ -116,29 +138,28 @@ def test_save_custom_query_fails_validation(mock_db_connection):
             "user@test.com",
         )
 
-        assert not success
-        assert "Query failed validation" in message
-        # Ensure no attempt was made to insert into the DB
-        mock_db_connection.execute.assert_not_called()
+    assert not success
+    assert "Query failed validation" in message
+    # Only the EXPLAIN was issued; no attempt was made to insert into the DB
+    mock_db_connection.execute.assert_called_once_with(
+        "EXPLAIN SELECT * FROM non_existent_table"
+    )
 
 
 def test_save_custom_query_success(mock_db_connection):
     """Tests that a valid query is successfully saved."""
-    with (
-        patch("enviroflow_app.helpers.query_helpers.execute_query") as mock_execute,
-        patch("enviroflow_app.helpers.query_helpers.get_db_schema") as mock_get_schema,
-    ):
-        # Mock successful validation
-        mock_execute.return_value = pl.DataFrame()
+    # EXPLAIN succeeds, then the INSERT runs
+    mock_db_connection.execute.side_effect = [None, None]
+
+    with patch("enviroflow_app.helpers.query_helpers.get_db_schema") as mock_get_schema:
         mock_get_schema.return_value = {"my_table": ["col1"]}
 
         success, message = save_custom_query(
             mock_db_connection, "Good Query", "SELECT * FROM my_table", "user@test.com"
         )
 
-        assert success
-        assert "Query saved successfully" in message
-        # Check that the INSERT statement was called
-        mock_db_connection.execute.assert_called_once()
-        call_args = mock_db_connection.execute.call_args[0]
-        assert "INSERT INTO custom_queries" in call_args[0]
+    assert success
+    assert "Query saved successfully" in message
+    explain_call, insert_call = mock_db_connection.execute.call_args_list
+    assert explain_call.args[0] == "EXPLAIN SELECT * FROM my_table"
+    assert "INSERT INTO custom_queries" in insert_call.args[0]
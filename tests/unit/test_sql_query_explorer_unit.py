@@ -6,7 +6,49 @@ Tests query loading, template detection, and other logic without requiring datab
 
 from pathlib import Path
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
+
+_JINJA_VAR_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+_DATE_FN_RE = re.compile(r"DATE\(([^)]+)\)")
+# Leading whitespace and `--` comment lines before the first SQL keyword
+_LEADING_TRIVIA_RE = re.compile(r"\s*(?:--[^\n]*(?:\n\s*|$))*")
+
+# Operational queries that shouldn't be run through the query explorer
+_EXCLUDED_FILES = frozenset(
+    {
+        "filter_table.sql",
+        "filter_vo_quotes.sql",
+        "generate_item_budget_table.sql",
+        "update_quotes.sql",
+        "update_item_budget_table.sql",
+    }
+)
+_DDL_PREFIXES = ("CREATE", "UPDATE", "DELETE", "DROP", "ALTER", "INSERT")
+
+
+def _classify(content: str) -> Tuple[bool, List[str], bool]:
+    """Classify a query file's content for the predefined query loader.
+
+    Returns (has_template_syntax, variables, should_skip), where should_skip
+    flags DDL/DML statements and Jinja2 logic the explorer can't handle.
+    """
+    # Only the leading keyword matters, so avoid upper-casing the whole file
+    start = _LEADING_TRIVIA_RE.match(content).end()
+    head = content[start : start + 10].upper()
+    if head.startswith(_DDL_PREFIXES):
+        return False, [], True
+
+    variables = _JINJA_VAR_RE.findall(content)
+    has_template_syntax = bool(variables) or "{{" in content
+
+    # Skip queries with complex Jinja2 logic that our simple system can't handle
+    block = content.find("{%")
+    while block != -1:
+        if content.startswith(("{% for", "{% if"), block):
+            return has_template_syntax, variables, True
+        block = content.find("{%", block + 2)
+
+    return has_template_syntax, variables, ".pop(" in content
 
 
 class TestSQLQueryExplorerUnit:
@@ -19,40 +61,27 @@ class TestSQLQueryExplorerUnit:
         queries = []
 
         for file_path, content in mock_files.items():
-            path = Path(file_path)
-
-            is_template = ".j2" in path.suffixes or "{{" in content
-            variables = (
-                re.findall(r"\{\{\s*(\w+)\s*\}\}", content) if is_template else []
-            )
+            # Skip specific operational queries before building a Path
+            if file_path.rsplit("/", 1)[-1] in _EXCLUDED_FILES:
+                continue
 
-            # Skip specific operational queries that shouldn't be run through the query explorer
-            excluded_files = {
-                "filter_table.sql",
-                "filter_vo_quotes.sql",
-                "generate_item_budget_table.sql",
-                "update_quotes.sql",
-                "update_item_budget_table.sql",
-            }
+            path = Path(file_path)
 
-            if Path(file_path).name in excluded_files:
+            # Skip DDL/DML statements and complex templates
+            has_template_syntax, variables, should_skip = _classify(content)
+            if should_skip:
                 continue
 
-            # Skip queries with complex Jinja2 logic that our simple system can't handle
-            if "{% for" in content or "{% if" in content or ".pop(" in content:
-                continue
+            is_template = ".j2" in path.suffixes or has_template_syntax
 
-            # Skip CREATE/UPDATE/DELETE statements for safety
-            content_upper = content.upper().strip()
-            if any(
-                content_upper.startswith(stmt)
-                for stmt in ["CREATE", "UPDATE", "DELETE", "DROP", "ALTER", "INSERT"]
-            ):
-                continue
+            # Path("x.sql.j2").stem is "x.sql", so trim the inner suffix
+            stem = path.stem
+            if stem.endswith(".sql"):
+                stem = stem[:-4]
 
             queries.append(
                 {
-                    "name": path.stem.replace(".sql", "").replace("_", " ").title(),
+                    "name": stem.replace("_", " ").title(),
                     "sql": content,
                     "is_template": is_template,
                     "variables": variables,
@@ -181,10 +210,7 @@ class TestSQLQueryExplorerUnit:
         )
 
         # Test that the correction pattern works
-        pattern = r"DATE\(([^)]+)\)"
-        replacement = r"\1::DATE"
-
-        result = re.sub(pattern, replacement, original_sql)
+        result = _DATE_FN_RE.sub(r"\1::DATE", original_sql)
         assert result == corrected_sql
 
     def test_template_rendering_simulation(self):
@@ -192,10 +218,8 @@ class TestSQLQueryExplorerUnit:
         template_sql = "SELECT * FROM quotes WHERE quote_no > '{{ quote_no }}'"
         variables = {"quote_no": "QU-0001"}
 
-        # Simple string replacement for testing (mimics Jinja2)
-        rendered = template_sql
-        for var, value in variables.items():
-            rendered = rendered.replace(f"{{{{ {var} }}}}", str(value))
+        # Single-pass substitution for testing (mimics Jinja2)
+        rendered = _JINJA_VAR_RE.sub(lambda m: str(variables[m.group(1)]), template_sql)
 
         expected = "SELECT * FROM quotes WHERE quote_no > 'QU-0001'"
         assert rendered == expected
@@ -255,6 +279,7 @@ class TestSQLQueryExplorerUnit:
             "delete_query.sql": "DELETE FROM job_cards WHERE id = 1",
             "insert_query.sql": "INSERT INTO job_cards VALUES (...)",
             "drop_query.sql": "DROP TABLE test_table",
+            "commented_query.sql": "-- Rebuild quotes\n-- nightly\n  create table quotes_copy AS SELECT 1",
         }
 
         queries = self.load_predefined_queries_mock(mock_files)
@@ -1,18 +1,24 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import os
-from functools import wraps
-from io import BytesIO
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
 from logging.config import dictConfig
+
+import orjson
 from streamlit import secrets
 from flask import (
     Flask,
+    Response,
     url_for,
     render_template,
     session,
     redirect,
-    json,
-    send_file,
+    make_response,
     request,
+    copy_current_request_context,
 )
 from flask_oauthlib.contrib.client import OAuth, OAuth2Application
 from flask_session import Session
@@ -20,12 +26,12 @@ from xero_python.accounting import AccountingApi, ContactPerson, Contact, Contac
 from xero_python.api_client import ApiClient, serialize
 from xero_python.api_client.configuration import Configuration
 from xero_python.api_client.oauth2 import OAuth2Token
-from xero_python.exceptions import AccountingBadRequestException
+from xero_python.exceptions import AccountingBadRequestException, RateLimitException
 from xero_python.identity import IdentityApi
-from xero_python.utils import getvalue
 
 import logging_settings
 from utils import jsonify, serialize_model
+from xero_quotes import Xero_Quotes_List, quotes_arrow_table
 
 dictConfig(logging_settings.default_settings)
 
@@ -51,6 +57,23 @@ Session(app)
 
 oauth = OAuth(app)
 
+# Scopes requested at login. The views use settings (organisations), contacts
+# (create) and transactions (invoices, quotes); the other read scopes remain
+# available to exported tokens.
+XERO_SCOPES = (
+    "openid",
+    "profile",
+    "email",
+    "offline_access",
+    "accounting.settings.read",
+    "accounting.contacts",
+    "accounting.transactions.read",
+    "accounting.reports.read",
+    "accounting.attachments.read",
+    "accounting.budgets.read",
+    "files.read",
+)
+
 xero = OAuth2Application(
     app,
     client_id=XERO_CLIENT_ID,
@@ -59,7 +82,7 @@ xero = OAuth2Application(
     authorization_url="https://login.xero.com/identity/connect/authorize",
     access_token_url="https://identity.xero.com/connect/token",
     refresh_token_url="https://identity.xero.com/connect/token",
-    scope="openid accounting.settings.read profile files accounting.contacts.read email accounting.settings payroll.settings accounting.attachments.read accounting.budgets.read payroll.payruns accounting.journals.read assets.read payroll.timesheets accounting.contacts projects accounting.transactions.read assets payroll.payslip accounting.transactions accounting.reports.read files.read projects.read offline_access payroll.employees accounting.attachments",
+    scope=" ".join(XERO_SCOPES),
 )
 
 
@@ -72,9 +95,60 @@ api_client = ApiClient(
             client_id=XERO_CLIENT_ID, client_secret=XERO_CLIENT_SECRET
         ),
     ),
-    pool_threads=1,
+    pool_threads=8,
 )
 
+# the SDK API wrappers hold no per-request state, so share one of each
+accounting_api = AccountingApi(api_client)
+identity_api = IdentityApi(api_client)
+
+# number of quote pages requested concurrently (Xero allows 5 concurrent calls
+# per tenant), quotes per full page, and retries per page on HTTP 429
+QUOTE_PAGE_WORKERS = 4
+QUOTE_PAGE_SIZE = 100
+RATE_LIMIT_RETRIES = 3
+
+# how long a rendered page is reused before it is fetched from Xero again
+PAGE_CACHE_SECONDS = 60
+
+# download headers for /export-token; Response sets Content-Length from the body
+EXPORT_TOKEN_HEADERS = {"Content-Disposition": "attachment; filename=oauth2_token.py"}
+
+# MotherDuck client shared across requests, connected on first save; Flask
+# serves requests on several threads, so creating or dropping it takes the lock
+_MD_SINGLETON = None
+_MD_LOCK = threading.Lock()
+
+
+def _get_md():
+    """Return the shared MotherDuck client, creating it on first use.
+
+    enviroflow_app reads its secrets when imported, so the import happens here,
+    inside the caller's error handling, rather than when the app starts.
+    """
+    global _MD_SINGLETON
+    with _MD_LOCK:
+        if _MD_SINGLETON is None:
+            from enviroflow_app.elt.motherduck.md import MotherDuck
+
+            _MD_SINGLETON = MotherDuck(
+                token=secrets["motherduck"]["token"],
+                db_name=secrets["motherduck"]["db"],
+            )
+        return _MD_SINGLETON
+
+
+def _reset_md():
+    """Drop the shared MotherDuck client so the next save reconnects."""
+    global _MD_SINGLETON
+    with _MD_LOCK:
+        _MD_SINGLETON = None
+
+
+def _pretty(obj):
+    """Pretty-print obj as sorted, indented JSON for the code views."""
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2).decode()
+
 
 # configure token persistence and exchange point between flask-oauthlib and xero-python
 @xero.tokengetter
@@ -108,42 +182,46 @@ def index():
     return render_template(
         "code.html",
         title="Home | oauth token",
-        code=json.dumps(xero_access, sort_keys=True, indent=4),
+        code=_pretty(xero_access),
     )
 
 
 @app.route("/tenants")
 @xero_token_required
 def tenants():
-    identity_api = IdentityApi(api_client)
-    accounting_api = AccountingApi(api_client)
-
-    available_tenants = []
-    connections = identity_api.get_connections()
-    if connections is None:
-        pass
-    elif isinstance(connections, (list, tuple)):
-        for connection in connections:
-            tenant = serialize(connection)
-            if getattr(connection, "tenant_type", None) == "ORGANISATION":
-                organisations = accounting_api.get_organisations(
-                    xero_tenant_id=getattr(connection, "tenant_id", None)
+    return conditional_response(render_tenants)
+
+
+def render_tenants():
+    connections = identity_api.get_connections() or []
+    if not isinstance(connections, (list, tuple)):
+        connections = [connections]
+    available_tenants = [serialize(connection) for connection in connections]
+
+    # fetch every organisation at once rather than one request per tenant
+    org_tenants = [
+        (tenant, getattr(connection, "tenant_id", None))
+        for tenant, connection in zip(available_tenants, connections)
+        if getattr(connection, "tenant_type", None) == "ORGANISATION"
+    ]
+    if org_tenants:
+        with ThreadPoolExecutor(max_workers=min(8, len(org_tenants))) as executor:
+            # the token getter reads the Flask session, so each worker needs
+            # its own copy of the request context
+            futures = [
+                executor.submit(
+                    copy_current_request_context(accounting_api.get_organisations),
+                    xero_tenant_id=tenant_id,
                 )
-                tenant["organisations"] = serialize(organisations)
-            available_tenants.append(tenant)
-    elif hasattr(connections, "tenant_type"):
-        tenant = serialize(connections)
-        if getattr(connections, "tenant_type", None) == "ORGANISATION":
-            organisations = accounting_api.get_organisations(
-                xero_tenant_id=getattr(connections, "tenant_id", None)
-            )
-            tenant["organisations"] = serialize(organisations)
-        available_tenants.append(tenant)
+                for _, tenant_id in org_tenants
+            ]
+            for (tenant, _), future in zip(org_tenants, futures):
+                tenant["organisations"] = serialize(future.result())
 
     return render_template(
         "code.html",
         title="Xero Tenants",
-        code=json.dumps(available_tenants, sort_keys=True, indent=4),
+        code=_pretty(available_tenants),
     )
 
 
@@ -151,8 +229,6 @@ def tenants():
 @xero_token_required
 def create_contact_person():
     xero_tenant_id = get_xero_tenant_id()
-    accounting_api = AccountingApi(api_client)
-
     contact_person = ContactPerson(
         first_name="John",
         last_name="Smith",
@@ -176,11 +252,8 @@ def create_contact_person():
         sub_title = f"Error: {reason}"
         code = jsonify(getattr(exception, "error_data", {}))
     else:
-        name = (
-            getvalue(getattr(created_contacts, "contacts", [{}]), "0.name", "")
-            if hasattr(created_contacts, "contacts")
-            else ""
-        )
+        contacts = getattr(created_contacts, "contacts", None)
+        name = getattr(contacts[0], "name", "") if contacts else ""
         sub_title = f"Contact {name} created."
         code = serialize_model(created_contacts)
 
@@ -193,8 +266,6 @@ def create_contact_person():
 @xero_token_required
 def create_multiple_contacts():
     xero_tenant_id = get_xero_tenant_id()
-    accounting_api = AccountingApi(api_client)
-
     contact = Contact(
         name="George Jetson",
         first_name="George",
@@ -216,16 +287,10 @@ def create_multiple_contacts():
     else:
         sub_title = ""
         result_list = []
-        contacts_list = (
-            getattr(created_contacts, "contacts", [])
-            if hasattr(created_contacts, "contacts")
-            else []
-        )
-        for contact in contacts_list:
+        for contact in getattr(created_contacts, "contacts", None) or []:
             if getattr(contact, "has_validation_errors", False):
-                error = getvalue(
-                    getattr(contact, "validation_errors", [{}]), "0.message", ""
-                )
+                errors = getattr(contact, "validation_errors", None)
+                error = getattr(errors[0], "message", "") if errors else ""
                 result_list.append(f"Error: {error}")
             else:
                 result_list.append(f"Contact {getattr(contact, 'name', '')} created.")
@@ -243,12 +308,14 @@ def create_multiple_contacts():
 @app.route("/invoices")
 @xero_token_required
 def get_invoices():
-    xero_tenant_id = get_xero_tenant_id()
-    accounting_api = AccountingApi(api_client)
+    return conditional_response(render_invoices, get_xero_tenant_id())
 
+
+def render_invoices():
+    xero_tenant_id = get_xero_tenant_id()
     invoices = accounting_api.get_invoices(xero_tenant_id)
     code = serialize_model(invoices)
-    invoices_list = getattr(invoices, "invoices", [])
+    invoices_list = getattr(invoices, "invoices", None) or []
     if not isinstance(invoices_list, (list, tuple)):
         invoices_list = []
     sub_title = f"Total invoices found: {len(invoices_list)}"
@@ -258,6 +325,37 @@ def get_invoices():
     )
 
 
+@lru_cache(maxsize=32)
+def cached_page(render, tenant_id, access_token, time_bucket):
+    """Render a page once per tenant, access token and time bucket.
+
+    The arguments after render are only part of the cache key: a refreshed
+    token or a new PAGE_CACHE_SECONDS window misses the cache and fetches
+    fresh data from Xero. Returns (etag, body).
+    """
+    body = render().encode("utf-8")
+    return hashlib.blake2b(body, digest_size=16).hexdigest(), body
+
+
+def conditional_response(render, tenant_id=None):
+    """Serve a rendered page with an ETag, answering 304 when it is unchanged."""
+    token = obtain_xero_oauth2_token() or {}
+    etag, body = cached_page(
+        render,
+        tenant_id,
+        token.get("access_token"),
+        int(time.time() // PAGE_CACHE_SECONDS),
+    )
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(body)
+    response.set_etag(etag)
+    # pages are per user, and browsers should always revalidate them
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @app.route("/login")
 def login():
     redirect_url = url_for("oauth_callback", _external=True)
@@ -275,12 +373,14 @@ def oauth_callback():
     # todo validate state value
     if response is None or response.get("access_token") is None:
         return "Access denied: response=%s" % response
+    clear_xero_tenant_id()
     store_xero_oauth2_token(response)
     return redirect(url_for("index", _external=True))
 
 
 @app.route("/logout")
 def logout():
+    clear_xero_tenant_id()
     store_xero_oauth2_token(None)
     return redirect(url_for("index", _external=True))
 
@@ -289,14 +389,8 @@ def logout():
 @xero_token_required
 def export_token():
     token = obtain_xero_oauth2_token()
-    buffer = BytesIO("token={!r}".format(token).encode("utf-8"))
-    buffer.seek(0)
-    return send_file(
-        buffer,
-        mimetype="x.python",
-        as_attachment=True,
-        download_name="oauth2_token.py",
-    )
+    body = "token={!r}".format(token).encode("utf-8")
+    return Response(body, mimetype="x.python", headers=EXPORT_TOKEN_HEADERS)
 
 
 @app.route("/refresh-token")
@@ -315,8 +409,6 @@ def refresh_token():
 @app.route("/all_quotes", methods=["GET", "POST"])
 @xero_token_required
 def get_all_quotes():
-    from xero_quotes import Xero_Quotes_List
-
     xero_tenant_id = get_xero_tenant_id()
     if not xero_tenant_id:
         return render_template(
@@ -328,23 +420,21 @@ def get_all_quotes():
             message="Error: Missing Xero tenant ID. Please ensure you are connected to a Xero organisation.",
             show_button=True,
         )
-    accounting_api = AccountingApi(api_client)
     if request.method == "POST" and request.form.get("submit_button") == "Fetch JSON":
-        all_quotes = []
-        from xero_python.api_client import serialize
-
-        page = 1
-        while True:
-            try:
-                result = accounting_api.get_quotes(xero_tenant_id, page=page)  # type: ignore
-                quotes = getattr(result, "quotes", [])
-                if not quotes:
-                    break
-                all_quotes.extend([serialize(q) for q in quotes])
-                page += 1
-            except Exception as e:
-                print(f"Error fetching quotes on page {page}: {e}")
-                break
+        try:
+            all_quotes = fetch_all_quote_pages(accounting_api, xero_tenant_id)
+        except Exception as e:
+            # a partial fetch would replace the saved tables with a subset of
+            # the quotes, so nothing is saved when any page fails
+            return render_template(
+                "show_quotes.html",
+                title="Quotes",
+                code="",
+                data=None,
+                sub_title="",
+                message=f"Error fetching quotes from Xero: {e}<br>Nothing was saved.",
+                show_button=True,
+            )
         if not all_quotes:
             return render_template(
                 "show_quotes.html",
@@ -356,48 +446,34 @@ def get_all_quotes():
                 show_button=True,
             )
         quotes_list_obj = Xero_Quotes_List(all_quotes)
+        # Xero_Quotes_List builds both tables in one pass and has already
+        # dropped deleted quotes from them
         df_human = getattr(quotes_list_obj, "quotes_df_human", None)
-        import pandas as pd
-
-        full_lines = []
-        if hasattr(quotes_list_obj, "quotes_list"):
-            for q in quotes_list_obj.quotes_list:
-                if hasattr(q, "quote_lines_df") and q.quote_lines_df is not None:
-                    full_lines.append(q.quote_lines_df)
-        df_full = pd.concat(full_lines, ignore_index=True) if full_lines else None
+        df_full = getattr(quotes_list_obj, "quotes_df", None)
         success_msg = ""
-        # Filter out deleted quotes before saving to MotherDuck
-        if df_full is not None and "quote_status" in df_full.columns:
-            df_full = df_full[df_full["quote_status"] != "DELETED"]
-        if df_human is not None and "quote_status" in df_human.columns:
-            df_human = df_human[df_human["quote_status"] != "DELETED"]
         try:
-            from enviroflow_app.elt.motherduck.md import MotherDuck
-
-            md_token = secrets["motherduck"]["token"]
-            md_db = secrets["motherduck"]["db"]
-            md = MotherDuck(token=md_token, db_name=md_db)
-            import polars as pl
+            md = _get_md()
 
+            # Hand both tables to DuckDB as Arrow and write them concurrently;
+            # save_table uses a cursor per call, so the shared client is safe
+            tables = []
             if df_human is not None:
-                md.save_table("xero_quotes", pl.DataFrame(df_human))
+                tables.append(("xero_quotes", quotes_arrow_table(df_human)))
             if df_full is not None:
-                md.save_table("full_xero_quotes", pl.DataFrame(df_full))
+                tables.append(("full_xero_quotes", quotes_arrow_table(df_full)))
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(lambda t: md.save_table(*t), tables))
             success_msg = (
                 "✅ Successfully saved xero_quotes and full_xero_quotes to MotherDuck."
             )
         except Exception as e:
+            _reset_md()
             success_msg = f"MotherDuck save error: {e}"
 
         df_head_html = "No DataFrame available."
-        # Always filter out deleted quotes before displaying
-        df_full_display = (
-            df_full[df_full["quote_status"] != "DELETED"]
-            if df_full is not None and "quote_status" in df_full.columns
-            else df_full
-        )
-        if df_full_display is not None and "quote_no" in df_full_display.columns:
-            df_head = df_full_display.sort_values(by="quote_no", ascending=False).head()
+        # Deleted quotes were already dropped above
+        if df_full is not None and "quote_no" in df_full.columns:
+            df_head = df_full.sort_values("quote_no", ascending=False).head()
             df_head_html = df_head.to_html(index=False)
         sub_title = f"Total number of quotes: {len(all_quotes)}"
         message = f"Quotes Loaded<br>{success_msg}"
@@ -422,12 +498,75 @@ def get_all_quotes():
     )
 
 
+def get_quotes_page(accounting_api, xero_tenant_id, page):
+    """Fetch and serialize one page of quotes, retrying when rate limited.
+
+    Serializing here keeps the per-quote conversion on the worker threads, so
+    it overlaps with the requests still in flight for other pages.
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            result = accounting_api.get_quotes(xero_tenant_id, page=page)  # type: ignore
+            return [serialize(q) for q in getattr(result, "quotes", []) or []]
+        except RateLimitException as exception:
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            headers = getattr(exception, "headers", None) or {}
+            time.sleep(float(headers.get("Retry-After", 2**attempt)))
+
+
+def fetch_all_quote_pages(accounting_api, xero_tenant_id):
+    """Fetch every page of quotes, requesting QUOTE_PAGE_WORKERS pages at a time.
+
+    The first page is requested on its own, so accounts with a single page of
+    quotes spend one call. Pages are merged in order and fetching stops at the
+    first short page, so no further batch is sent once the last page has been
+    seen. A page that still fails after its retries is logged and re-raised,
+    rather than returning the quotes read so far.
+    """
+    all_quotes = []
+    next_page = 1
+    batch_size = 1
+    with ThreadPoolExecutor(max_workers=QUOTE_PAGE_WORKERS) as executor:
+        while True:
+            pages = range(next_page, next_page + batch_size)
+            # the token getter reads the Flask session, so each worker needs
+            # its own copy of the request context
+            futures = [
+                executor.submit(
+                    copy_current_request_context(get_quotes_page),
+                    accounting_api,
+                    xero_tenant_id,
+                    page,
+                )
+                for page in pages
+            ]
+            for page, future in zip(pages, futures):
+                try:
+                    quotes = future.result()
+                except Exception:
+                    app.logger.exception("Error fetching quotes on page %s", page)
+                    raise
+                all_quotes.extend(quotes)
+                if len(quotes) < QUOTE_PAGE_SIZE:
+                    return all_quotes
+            next_page += batch_size
+            batch_size = QUOTE_PAGE_WORKERS
+
+
 def get_xero_tenant_id():
     token = obtain_xero_oauth2_token()
     if not token:
         return None
 
-    identity_api = IdentityApi(api_client)
+    # Reuse the tenant resolved for this access token rather than calling the
+    # Identity API on every request
+    token_sig = token.get("access_token")
+    tenant_id = session.get("tenant_id")
+    if tenant_id and session.get("tenant_id_sig") == token_sig:
+        return tenant_id
+
+    tenant_id = None
     connections = identity_api.get_connections()
     if connections is None:
         return None
@@ -435,19 +574,28 @@ def get_xero_tenant_id():
     if isinstance(connections, (list, tuple)):
         for connection in connections:
             if getattr(connection, "tenant_type", None) == "ORGANISATION":
-                return getattr(connection, "tenant_id", None)
-    elif hasattr(connections, "tenant_type"):
-        if getattr(connections, "tenant_type", None) == "ORGANISATION":
-            return getattr(connections, "tenant_id", None)
+                tenant_id = getattr(connection, "tenant_id", None)
+                break
+    elif getattr(connections, "tenant_type", None) == "ORGANISATION":
+        tenant_id = getattr(connections, "tenant_id", None)
+
+    if tenant_id:
+        session["tenant_id"] = tenant_id
+        session["tenant_id_sig"] = token_sig
+        session.modified = True
+    return tenant_id
+
+
+def clear_xero_tenant_id():
+    session.pop("tenant_id", None)
+    session.pop("tenant_id_sig", None)
+    session.modified = True
 
 
 @app.route("/quotes")
 @xero_token_required
 def get_quotes():
     # add a datepicker https://www.youtube.com/watch?v=jAdFZa6KZNE
-    xero_tenant_id = get_xero_tenant_id()
-    accounting_api = AccountingApi(api_client)
-
     xero_tenant_id = get_xero_tenant_id()
     if not xero_tenant_id:
         return render_template(
@@ -459,7 +607,7 @@ def get_quotes():
             message="Error: Missing Xero tenant ID. Please ensure you are connected to a Xero organisation.",
         )
     result = accounting_api.get_quotes(xero_tenant_id)
-    quotes = getattr(result, "quotes", [])
+    quotes = getattr(result, "quotes", None) or []
     code = serialize_model(result)
     sub_title = "Total quotes found: {}".format(len(quotes))
     data = "nothing to see yet!"
@@ -2,6 +2,9 @@
 
 default_settings = {
     "version": 1,
+    # app.py imports modules such as xero_quotes, which create their loggers,
+    # before this config is applied; keep those loggers enabled
+    "disable_existing_loggers": False,
     "formatters": {
         "default": {"format": "[%(asctime)s] %(levelname)s in %(module)s: %(message)s"},
         "verbose": {
@@ -21,6 +24,7 @@ default_settings = {
         "requests_oauthlib": {"handlers": ["console"], "level": "DEBUG"},
         "xero_python": {"handlers": ["console"], "level": "DEBUG"},
         "urllib3": {"handlers": ["console"], "level": "DEBUG"},
+        "xero_quotes": {"handlers": ["console"], "level": "INFO"},
     },
     # "root": {"level": "DEBUG", "handlers": ["console"]},
 }
@@ -1,27 +1,179 @@
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain
+import logging
 import re
-import json
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+
+# orjson is a project dependency; the fallbacks only matter for a bare install
+try:
+    from orjson import loads as load_json
+except ImportError:
+    try:
+        from ujson import loads as load_json
+    except ImportError:
+        from json import loads as load_json
+
+# only needed to stream very large multi-page dumps
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 
 # import sqlalchemy
 
+# Per-field parse notes are collected in error_list and logged at debug level,
+# so they cost no output unless debug logging is switched on
+logger = logging.getLogger(__name__)
+
+# milliseconds since the epoch inside a Xero "/Date(...)/" string
+_UTC_MS_RE = re.compile(r"\d{13}")
+
+# a line's share of the job, e.g. "25%" or "12.5%" in its description
+_PCT_RE = re.compile(r"(?<![\d.])(?P<pct>\d+(?:\.\d+)?)%")
+
+# columns left out of the human-readable quotes table
+ID_COLUMNS = ["quote_id", "contact_id", "line_id"]
+
+# quote fields repeated on each of its lines, and the fields read from each line
+META_COLUMNS = (
+    "quote_no",
+    "quote_ref",
+    "customer",
+    "quote_id",
+    "contact_id",
+    "quote_status",
+    "created",
+    "updated",
+)
+LINE_COLUMNS = (
+    "item_code",
+    "item_desc",
+    "line_id",
+    "quantity",
+    "unit_price",
+    "line_total",
+)
+
+# line columns that hold amounts; missing values become NaN
+NUMERIC_COLUMNS = ("quantity", "unit_price", "line_total")
+
+# quote date columns, saved to MotherDuck as millisecond timestamps
+DATE_COLUMNS = ("created", "updated")
+
+# line item fields read from each quote
+LINE_ITEM_KEYS = (
+    "ItemCode",
+    "Description",
+    "LineItemID",
+    "Quantity",
+    "UnitAmount",
+    "LineAmount",
+)
+
+
+# Quotes in a pull share many creation dates and update times, so the parsed
+# values are cached on the raw strings
+@lru_cache(maxsize=4096)
+def parse_date_string(date_string: str) -> datetime:
+    """
+    Parses a Xero DateString such as "2023-01-05T00:00:00"
+    """
+    return datetime.fromisoformat(date_string)
+
+
+@lru_cache(maxsize=4096)
+def parse_xero_date_string(date_string: str) -> datetime:
+    """
+    Parses a Xero "/Date(1672531200000+0000)/" timestamp as a naive UTC datetime
+    """
+    utc_string = _UTC_MS_RE.search(date_string).group()
+    return datetime.utcfromtimestamp(int(utc_string) / 1000)
+
+
+def _pct(description) -> float:
+    """
+    Returns the percentage in a line description, or 100 when it has none
+    """
+    match = _PCT_RE.search(description) if description else None
+    return float(match.group("pct")) if match else 100.0
+
+
+def build_quote_lines_df(quotes: list) -> pd.DataFrame:
+    """
+    Builds the quote lines table for the given quotes, adding each line's percentage
+    """
+    # Each quote's metadata is repeated once per line in a single np.repeat,
+    # rather than building per-quote lists and concatenating them
+    counts = [len(quote.quote_lines_columns["line_id"]) for quote in quotes]
+    meta = np.empty((len(quotes), len(META_COLUMNS)), dtype=object)
+    meta[:] = [quote.quote_lines_meta for quote in quotes]
+    meta = np.repeat(meta, counts, axis=0)
+
+    lines = {
+        name: list(
+            chain.from_iterable(quote.quote_lines_columns[name] for quote in quotes)
+        )
+        for name in LINE_COLUMNS
+    }
+    # Descriptions repeat a lot across quotes, so run the regex once per
+    # distinct description. Missing descriptions get code -1, which picks the
+    # trailing 100% entry.
+    codes, uniques = pd.factorize(
+        np.array(lines["item_desc"], dtype=object), sort=False
+    )
+    unique_pct = np.fromiter(
+        (_pct(d) for d in uniques), dtype=np.float64, count=len(uniques)
+    )
+    unique_pct = np.round(np.append(unique_pct, 100.0) / 100.0, 2)
+    line_pct = unique_pct[codes]
+
+    # Build the frame in one go, with line_pct between the quote metadata and
+    # the line item fields
+    data = {name: meta[:, i] for i, name in enumerate(META_COLUMNS)}
+    data["line_pct"] = line_pct
+    for name, values in lines.items():
+        if name in NUMERIC_COLUMNS:
+            values = np.array(values, dtype=np.float64)
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def quotes_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Converts a quotes table to Arrow for saving, with the quote dates as millisecond timestamps
+    """
+    # Dates held as datetime.date would otherwise be saved as DATE rather than
+    # the TIMESTAMP_MS columns downstream queries read
+    dates = {
+        name: pd.to_datetime(df[name]).astype("datetime64[ms]")
+        for name in DATE_COLUMNS
+        if name in df.columns
+    }
+    return pa.Table.from_pandas(df.assign(**dates), preserve_index=False)
+
 
 class Xero_Quote:
-    source_dict: dict
-    quote_id: str
-    quote_number: str
-    quote_ref: str
-    quote_contact_id: str
-    quote_contact_name: str
-    quote_contact_email: str
-    quote_status: str
-    quote_created: datetime
-    quote_updated: datetime
-    quote_total_ex_tax: str
-    quote_lines_dict: dict
-    quote_lines_df: pd.DataFrame
-    quote_lines_df_human: pd.DataFrame
+    __slots__ = (
+        "source_dict",
+        "error_list",
+        "quote_id",
+        "quote_number",
+        "quote_ref",
+        "quote_contact_id",
+        "quote_contact_name",
+        "quote_contact_email",
+        "quote_status",
+        "quote_created",
+        "quote_updated",
+        "quote_total_ex_tax",
+        "quote_lines_dict",
+        "quote_lines_columns",
+        "quote_lines_meta",
+    )
 
     def __init__(self, xero_quote_dict: dict):
         self.source_dict = xero_quote_dict
@@ -32,109 +184,72 @@ class Xero_Quote:
         self.quote_contact_name = self.source_dict["Contact"]["Name"]
         self.quote_status = xero_quote_dict["Status"]
         self.quote_total_ex_tax = self.source_dict["SubTotal"]
-        self.quote_created = datetime.strptime(
-            self.source_dict["DateString"], "%Y-%m-%dT%H:%M:%S"
-        )
-        try:
-            self.quote_ref = self.source_dict["Reference"]
-        except:
+        self.quote_created = parse_date_string(self.source_dict["DateString"])
+        self.quote_ref = self.source_dict.get("Reference")
+        if self.quote_ref is None:
             err_str = f"no reference found for quote: {self.quote_number}"
-            self.quote_ref = None
             self.error_list.append(err_str)
-            print(err_str)
-        try:
-            self.quote_contact_email = xero_quote_dict["Contact"]["EmailAddress"]
-        except:
+            logger.debug(err_str)
+        self.quote_contact_email = xero_quote_dict["Contact"].get("EmailAddress")
+        if self.quote_contact_email is None:
             err_str = f"no email address for quote: {self.quote_number}"
             self.error_list.append(err_str)
-            print(err_str)
-
-        def parse_xero_date_string(date_string):
-            utc_string = re.findall(r"\d{13}", date_string)[0]
-            time = datetime.utcfromtimestamp(int(utc_string) / 1000)
-            return time
+            logger.debug(err_str)
 
         try:
             self.quote_updated = parse_xero_date_string(
                 self.source_dict["UpdatedDateUTC"]
             )
-        except:
+        except (KeyError, AttributeError, TypeError, ValueError):
             err_str = f"failed to parse updated date for quote: {self.quote_number}"
             self.error_list.append(err_str)
-            print(err_str)
+            logger.debug(err_str)
 
         self.quote_lines_dict = self.source_dict["LineItems"]
+        self.quote_lines_columns = self.decode_xero_quote_lines()
+        # in META_COLUMNS order
+        self.quote_lines_meta = (
+            self.quote_number,
+            self.quote_ref,
+            self.quote_contact_name,
+            self.quote_id,
+            self.quote_contact_id,
+            self.quote_status,
+            self.quote_created.date(),
+            self.quote_updated.date(),
+        )
 
-        def decode_xero_quote_lines(self):
-            # DONE extract the line percentages from the quote , pre prepared regex (\d[0-9]*[.]\d[0-9]{0,3}[%])| |(\d[0-9][%])
-            i_code = []
-            desc = []
-            line_id = []
-            qty = []
-            unit_price = []
-            line_total = []
-
-            def try_decode_quote_line(item, list_to_append, key):
-                try:
-                    list_to_append.append(item[key])
-                except:
-                    list_to_append.append(None)
-                    err_str = f"no {key} for line {item['LineItemID']} in quote {self.quote_number}"
+    def decode_xero_quote_lines(self):
+        # DONE extract the line percentages from the quote , pre prepared regex (\d[0-9]*[.]\d[0-9]{0,3}[%])| |(\d[0-9][%])
+        # Deleted quotes are left out of every table, so skip their lines
+        items = () if self.quote_status == "DELETED" else self.quote_lines_dict
+        i_code = [li.get("ItemCode") for li in items]
+        desc = [li.get("Description") for li in items]
+        line_id = [li.get("LineItemID") for li in items]
+        qty = [li.get("Quantity") for li in items]
+        unit_price = [li.get("UnitAmount") for li in items]
+        line_total = [li.get("LineAmount") for li in items]
+
+        for li in items:
+            for key in LINE_ITEM_KEYS:
+                if key not in li:
+                    err_str = f"no {key} for line {li.get('LineItemID')} in quote {self.quote_number}"
                     self.error_list.append(err_str)
-                    print(err_str)
-
-            for i in self.quote_lines_dict:
-                try_decode_quote_line(i, i_code, "ItemCode")
-                try_decode_quote_line(i, desc, "Description")
-                try_decode_quote_line(i, line_id, "LineItemID")
-                try_decode_quote_line(i, qty, "Quantity")
-                try_decode_quote_line(i, unit_price, "UnitAmount")
-                try_decode_quote_line(i, line_total, "LineAmount")
-
-            lines_dict = {
-                "item_code": i_code,
-                "item_desc": desc,
-                "line_id": line_id,
-                "quantity": qty,
-                "unit_price": unit_price,
-                "line_total": line_total,
-            }
-            lines_df = pd.DataFrame(lines_dict)
-
-            line_pct = lines_df["item_desc"].str.extract(
-                r"(\d[0-9]*[.]\d[0-9]{0,3}[%])|(\d[0-9][%])", expand=False
-            )
-            line_pct.fillna("", inplace=True)
-            line_pct = (
-                line_pct.iloc[:, [0, 1]]
-                .agg("".join, axis=1)
-                .str.rstrip("%")
-                .replace("", "100")
-                .astype(float)
-                .div(100)
-                .round(2)
-            )
-            lines_df.insert(0, "line_pct", line_pct)
-            lines_df.insert(0, "updated", self.quote_updated)
-            lines_df.insert(0, "created", self.quote_created)
-            lines_df.insert(0, "quote_status", self.quote_status)
-            lines_df.insert(0, "contact_id", self.quote_contact_id)
-            lines_df.insert(0, "quote_id", self.quote_id)
-            lines_df.insert(0, "customer", self.quote_contact_name)
-            lines_df.insert(0, "quote_ref", self.quote_ref)
-            lines_df.insert(0, "quote_no", self.quote_number)
-            return lines_df
-
-        self.quote_lines_df = decode_xero_quote_lines(self)
-        self.quote_lines_df["created"] = self.quote_lines_df["created"].apply(
-            lambda x: x.date()
-        )
-        self.quote_lines_df["updated"] = self.quote_lines_df["updated"].apply(
-            lambda x: x.date()
-        )
-        self.quote_lines_df_human = self.quote_lines_df.drop(
-            ["quote_id", "contact_id", "line_id"], axis=1
-        )
+                    logger.debug(err_str)
+
+        return {
+            "item_code": i_code,
+            "item_desc": desc,
+            "line_id": line_id,
+            "quantity": qty,
+            "unit_price": unit_price,
+            "line_total": line_total,
+        }
+
+    @property
+    def quote_lines_df(self) -> pd.DataFrame:
+        """This quote's lines as a DataFrame, built on access."""
+        return build_quote_lines_df([self])
 
     def __repr__(self):
         return f"""
@@ -150,7 +265,7 @@ quote_created_date = {self.quote_created}
 quote_last_updates = {self.quote_updated}
 quote_total_ex_tax = {self.quote_total_ex_tax}
 number of errors = {len(self.error_list)}
-number of lines in quote = {len(self.quote_lines_df.index)}
+number of lines in quote = {len(self.quote_lines_dict)}
 -----------\n
                 """
 
@@ -174,38 +289,37 @@ number of lines in quote = {len(self.quote_lines_df.index)}
 
 
 class Xero_Quotes_List:
+    __slots__ = (
+        "quotes_list_json",
+        "quote_index",
+        "quotes_list",
+        "error_list",
+        "quotes_df",
+        "quotes_df_human",
+    )
+
     def __init__(self, quotes_list_json):
         self.quotes_list_json = quotes_list_json
         self.quote_index = []
         self.quotes_list = []
-        self.quotes_list_human = []
         self.error_list = []
         for x in self.quotes_list_json:
             try:
                 decoded_quote = Xero_Quote(x)
                 self.quotes_list.append(decoded_quote)
-                self
-                self.error_list = self.error_list + decoded_quote.error_list
-            except:
-                print(f"failed to read: {x['QuoteNumber']}")
-        try:
-            qdf = pd.concat(
-                [x.quote_lines_df for x in self.quotes_list], ignore_index=True
-            )
-            qdf.drop(qdf[qdf["quote_status"] == "DELETED"].index, inplace=True)
+                self.error_list.extend(decoded_quote.error_list)
+            except (KeyError, AttributeError, TypeError, ValueError):
+                logger.warning("failed to read: %s", x.get("QuoteNumber"))
+        # Build the table once for all quotes, rather than one DataFrame per
+        # quote followed by a concat. Deleted quotes have no decoded lines, so
+        # they add no rows.
+        if self.quotes_list:
+            qdf = build_quote_lines_df(self.quotes_list)
             self.quotes_df = qdf
-        except:
-            print("failed to concatenate quotes")
+            self.quotes_df_human = qdf.drop(columns=ID_COLUMNS)
+        else:
+            logger.warning("failed to build quotes table: no quotes were read")
             self.quotes_df = None
-
-        try:
-            qdfh = pd.concat(
-                [x.quote_lines_df_human for x in self.quotes_list], ignore_index=True
-            )
-            qdfh.drop(qdfh[qdfh["quote_status"] == "DELETED"].index, inplace=True)
-            self.quotes_df_human = qdfh
-        except:
-            print("failed to concatenate quotes")
             self.quotes_df_human = None
 
     def __repr__(self):
@@ -223,46 +337,58 @@ List of Xero Quotes
 
 
 def read_single_quote_from_file(file_path: str) -> Xero_Quote:
-    with open(file_path) as f:
-        quote_dict = json.load(f)
+    with open(file_path, "rb") as f:
+        quote_dict = load_json(f.read())
     return Xero_Quote(quote_dict)
 
 
 def read_quotes_list_json_from_file(file_path: str) -> dict:
-    with open(file_path) as f:
-        quotes_list_json = json.load(f)["Quotes"]
+    with open(file_path, "rb") as f:
+        quotes_list_json = load_json(f.read())["Quotes"]
 
     return quotes_list_json
 
 
-def read_quotes_list_multi_page_json(data: dict) -> tuple[int, dict]:
+def _collect_quote_pages(pages) -> tuple[int, list]:
     """
-    Reads the the json file containing the list of quotes when it is a multi-page jason query
+    Joins the quotes from each non-empty page, counting the pages read
     """
     quotes_list_json = []
     pages_read = 0
-    for key in data:
-        if data[key]["Quotes"] != []:
-            quotes_list_json = quotes_list_json + data[key]["Quotes"]
+    for page in pages:
+        quotes = page["Quotes"]
+        if quotes:
+            quotes_list_json.extend(quotes)
             pages_read += 1
 
     return (pages_read, quotes_list_json)
 
 
+def read_quotes_list_multi_page_json(data: dict) -> tuple[int, dict]:
+    """
+    Reads the the json file containing the list of quotes when it is a multi-page jason query
+    """
+    return _collect_quote_pages(data.values())
+
+
 def from_file_read_quotes_list_multi_page_json(file_path: str) -> tuple[int, dict]:
     """
     Reads the the json file containing the list of quotes when it is a multi-page jason query
     """
-    quotes_list_json = []
-    pages_read = 0
-    with open(file_path) as f:
-        read_json = json.load(f)
-    for key in read_json:
-        if read_json[key]["Quotes"] != []:
-            quotes_list_json = quotes_list_json + read_json[key]["Quotes"]
-            pages_read += 1
+    with open(file_path, "rb") as f:
+        read_json = load_json(f.read())
+    return _collect_quote_pages(read_json.values())
 
-    return (pages_read, quotes_list_json)
+
+def stream_quotes_list_multi_page_json(file_path: str) -> tuple[int, dict]:
+    """
+    Reads a multi-page quotes json file one page at a time, for dumps too large to load whole
+    """
+    if ijson is None:
+        raise ImportError("ijson is required to stream quote files")
+    with open(file_path, "rb") as f:
+        pages = (page for _, page in ijson.kvitems(f, "", use_float=True))
+        return _collect_quote_pages(pages)
 
 
 # quote = read_single_quote("single_quote.json")